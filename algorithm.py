@@ -4,13 +4,38 @@
 This module defines the Basis class for classes
 containing one solution algorithm.
 """
+import contextlib
+import os
 import sys
+import threading
 import time
+import tracemalloc
+import numpy as np
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# seconds between two samples of the resident set size of a phase
+RSS_INTERVAL = 0.05
+
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+class BudgetExceeded(Exception):
+    """
+    raised by an algorithm which does not start because
+    its estimated memory or time exceeds its budget
+    """
 
 
 class Algorithm(object):
     """
     Basis class for classes containing one solution algorithm.
+
+    uses_model and uses_cutoff tell compare whether the results
+    depend on the model and cutoff arguments of solve.
     
     >>> algorithm = Algorithm()
     >>> print(algorithm)
@@ -44,6 +69,9 @@ class Algorithm(object):
     NotImplementedError
     """
 
+    uses_model = True
+    uses_cutoff = True
+
     def __init__(self):
         """
         intitalize algorithm
@@ -60,6 +88,9 @@ class Algorithm(object):
         self._ov = None
         self._solution = None
         self._best_known = None
+        self._phases = {}
+        self._model_size = None
+        self._note = None
 
     def __str__(self):
         """
@@ -129,6 +160,23 @@ class Algorithm(object):
         """
         raise AssertionError("Not allowed to write to the private variable Algorithm.solution!")
 
+    @property
+    def permutation(self):
+        """
+        solution as integer array permutation[unit] = place, None without solution
+
+        >>> algorithm = Algorithm()
+        >>> algorithm._solution = [[0.0, 2.0], [1.0, 0.0], [2.0, 1.0]]
+        >>> algorithm.permutation.tolist()
+        [2, 0, 1]
+        """
+        if self._solution is None:
+            return None
+        permutation = np.full(len(self._solution), -1, dtype=np.int64)
+        for unit, place in self._solution:
+            permutation[int(unit)] = int(place)
+        return permutation
+
     @property
     def time(self):
         """
@@ -177,11 +225,183 @@ class Algorithm(object):
         """
         raise AssertionError("Not allowed to write to the private variable Algorithm.name!")
 
+    def phases(self):
+        """
+        measurements of the phases of the last solve, a dictionary
+        phase -> {'wall', 'cpu', 'rss'} with seconds and MB,
+        'memory' is added if tracemalloc is tracing, 'rss' is None
+        where /proc is missing
+
+        >>> algorithm = Algorithm()
+        >>> with algorithm.phase('build'):
+        ...     pass
+        >>> sorted(algorithm.phases()['build'])
+        ['cpu', 'rss', 'wall']
+        """
+        return {name: dict(record) for name, record in self._phases.items()}
+
+    def model_size(self):
+        """
+        {'variables', 'rows', 'nonzeros'} of the model of
+        the last solve, None if no model was built
+        """
+        return self._model_size
+
+    def note(self):
+        """
+        remark of the last solve, e.g. why the model was downgraded
+        """
+        return self._note
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        measure one phase of the algorithm: wall time, cpu time of the
+        process and its finished child processes (e.g. CBC), peak of the
+        resident set size of the process during the phase from VmHWM,
+        which is reset at its start, plus the peak of its running
+        children, sampled every RSS_INTERVAL seconds, and, if tracemalloc
+        is tracing, the peak of traced memory above the start of the phase;
+        phases must not be nested, a repeated phase is accumulated
+        """
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            memory = tracemalloc.get_traced_memory()[0]
+        # without a resettable VmHWM the resident set size of the process is sampled as well
+        reset = self.__reset_peak()
+        own = [] if reset else [self.__resident('self')]
+        children = [0.0]
+        stop = threading.Event()
+
+        def sample():
+            while not stop.wait(RSS_INTERVAL):
+                children.append(self.__children())
+                if not reset:
+                    own.append(self.__resident('self'))
+
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        wall, cpu = time.perf_counter(), self.__cpu_time()
+        try:
+            yield
+        finally:
+            stop.set()
+            sampler.join()
+            own.append(self.__peak() if reset else self.__resident('self'))
+            record = self._phases.setdefault(name, {'wall': 0.0, 'cpu': 0.0})
+            record['wall'] += time.perf_counter() - wall
+            record['cpu'] += self.__cpu_time() - cpu
+            rss = None if None in own else max(own) + max(children)
+            record['rss'] = rss if record.get('rss') is None else max(record['rss'], rss)
+            if tracing:
+                peak = (tracemalloc.get_traced_memory()[1] - memory) / 2 ** 20
+                record['memory'] = max(record.get('memory', 0.0), peak)
+
+    @staticmethod
+    def __cpu_time():
+        """
+        cpu seconds of this process and its finished children
+        """
+        if resource is None:
+            return time.process_time()
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return time.process_time() + children.ru_utime + children.ru_stime
+
+    @staticmethod
+    def __reset_peak():
+        """
+        reset VmHWM of this process, False if the kernel does not allow it
+        """
+        try:
+            with open('/proc/self/clear_refs', 'w') as clear_refs:
+                clear_refs.write('5')
+            return True
+        except OSError:
+            return False
+
+    @staticmethod
+    def __peak():
+        """
+        VmHWM of this process in MB, None without /proc
+        """
+        try:
+            with open('/proc/self/status') as status:
+                for line in status:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 2 ** 10
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def __resident(pid):
+        """
+        current resident set size in MB of a process, None without /proc
+        """
+        try:
+            with open('/proc/{}/statm'.format(pid)) as statm:
+                return int(statm.read().split()[1]) * PAGE_SIZE / 2 ** 20
+        except (OSError, IndexError):
+            return None
+
+    @staticmethod
+    def __children():
+        """
+        current resident set size in MB of the child processes of all
+        threads of this process, 0 if /proc does not list them
+        """
+        rss = 0.0
+        try:
+            tasks = os.listdir('/proc/self/task')
+        except OSError:
+            return rss
+        for task in tasks:
+            try:
+                with open('/proc/self/task/{}/children'.format(task)) as children:
+                    pids = children.read().split()
+            except OSError:
+                continue
+            for pid in pids:
+                rss += Algorithm.__resident(pid) or 0.0
+        return rss
+
+    def parameters(self):
+        """
+        arguments of __init__, which inherited classes
+        store in attributes with a leading underscore,
+        algorithms and arrays among them are made json serializable;
+        arguments which are not stored that way are left out, inherited
+        classes which store them differently override this method
+
+        >>> Algorithm().parameters()
+        {}
+        >>> class Stored(Algorithm):
+        ...     def __init__(self, seed=0, iterations=10, *args, **kwargs):
+        ...         super().__init__()
+        ...         self._seed = seed
+        >>> Stored(seed=3).parameters()
+        {'seed': 3}
+        """
+        import inspect
+
+        def serializable(value):
+            if isinstance(value, Algorithm):
+                return {value.name: value.parameters()}
+            if hasattr(value, 'tolist'):
+                return value.tolist()
+            return value
+
+        names = [name for name, parameter in inspect.signature(self.__class__.__init__).parameters.items()
+                 if parameter.kind not in (parameter.VAR_POSITIONAL, parameter.VAR_KEYWORD)][1:]
+        return {name: serializable(getattr(self, '_' + name)) for name in names if hasattr(self, '_' + name)}
+
     def algorithm(self, instance, model, cutoff, progress):
         """
         Solution algorithm. This method has to be implemented in
         all inherited classes and it has to set the variables
-        __ov, __ov_list and __solution.
+        __ov, __ov_list and __solution. It can measure its phases
+        with phase() and set _model_size.
         Calling this method causes an error.
 
         Arguments:
@@ -205,15 +425,52 @@ class Algorithm(object):
         model -- linearization model used
         cutoff -- rounding border
         progress -- boolean value whether the pulp progress is shown
+
+        ov and solution are reset before every run, an algorithm
+        which ends without a solution, e.g. a solver stopped by its
+        time limit before it found one, leaves them None and only
+        a solution which exists is verified
         """
+        self._phases = {}
+        self._model_size = None
+        self._note = None
+        self._ov = None
+        self._solution = None
         start_time = time.time()
         self.algorithm(instance, model, cutoff, progress)
         end_time = time.time()
-        assert instance.is_solution(self.solution)
+        with self.phase('verify'):
+            assert self.solution is None or instance.is_solution(self.solution)
         self._best_known = instance.get_solution()
         self.__time = end_time - start_time
 
 
+def start_permutation(start, instance, progress=False):
+    """
+    start of an algorithm as permutation[unit] = place: start is a
+    permutation or an Algorithm whose solution is used after it solved
+    instance, None if start is None
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> start_permutation([11, 3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 10], qap).tolist()[:3]
+    [11, 3, 0]
+    >>> start_permutation([0] * 12, qap)
+    Traceback (most recent call last):
+      ...
+    ValueError: start is not a permutation of the instance
+    """
+    if start is None:
+        return None
+    if isinstance(start, Algorithm):
+        start.solve(instance, None, 1.0, progress)
+        permutation = start.permutation
+    else:
+        permutation = np.asarray(start, dtype=np.int64)
+    if sorted(permutation.tolist()) != list(range(instance.instance_size())):
+        raise ValueError("start is not a permutation of the instance")
+    return permutation
+
 def main():
     """
     The main program for test purposes only.
@@ -0,0 +1,316 @@
+"""
+module with lower bounds for QAP which do not need a linearized model
+"""
+
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+def _reduce(n, d, f, a):
+    """
+    fixed units and places of the pairs a, the free units and places,
+    the linear costs of the free pairs (their interactions with the fixed
+    units and their diagonal terms) and the constant cost of the fixed pairs
+    """
+    fixed_units = np.array([int(element[0]) for element in a], dtype=np.int64)
+    fixed_places = np.array([int(element[1]) for element in a], dtype=np.int64)
+    units = np.setdiff1d(np.arange(n), fixed_units)
+    places = np.setdiff1d(np.arange(n), fixed_places)
+
+    constant = (d[np.ix_(fixed_units, fixed_units)] * f[np.ix_(fixed_places, fixed_places)]).sum()
+    linear = d[np.ix_(units, fixed_units)] @ f[np.ix_(places, fixed_places)].T \
+           + d[np.ix_(fixed_units, units)].T @ f[np.ix_(fixed_places, places)] \
+           + np.outer(d[units, units], f[places, places])
+    return fixed_units, fixed_places, units, places, linear, constant
+
+
+class GilmoreLawler(object):
+    """
+    Gilmore-Lawler bound (Gilmore 1962, Lawler 1963)
+
+    every free unit i and free place k get the cost of their fixed
+    interactions plus the minimal scalar product of row i of d and
+    row k of f over the free units and places, the linear assignment
+    problem over these costs bounds the free part from below
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> glb = GilmoreLawler(qap.instance_size(), qap.distance(), qap.intensity())
+    >>> glb.bound()
+    7245.0
+    >>> optimum = [[0, 6], [1, 4], [2, 11], [3, 1], [4, 0], [5, 2],
+    ...            [6, 8], [7, 10], [8, 9], [9, 5], [10, 7], [11, 3]]
+    >>> glb.bound(optimum[:6]) <= 9552
+    True
+    >>> glb.bound(optimum)
+    9552.0
+    """
+
+    def __init__(self, n, d, i):
+        """
+        n = instance size
+        d = distance matrix
+        i = intensity matrix
+        """
+        self._n = n
+        self._d = np.asarray(d, dtype=float)
+        self._i = np.asarray(i, dtype=float)
+        self._assignment = None
+
+    def bound(self, a=[]):
+        """
+        lower bound of all solutions containing the fixed
+        pairs a = [[unit, place], ...] like Model uses them
+        """
+        d, f = self._d, self._i
+        fixed_units, fixed_places, units, places, linear, constant = _reduce(self._n, d, f, a)
+        if len(units) == 0:
+            self._assignment = [[int(u), int(p)] for u, p in zip(fixed_units, fixed_places)]
+            return float(constant)
+
+        costs = linear + self.__minimal_scalar_products(d[np.ix_(units, units)], f[np.ix_(places, places)])
+
+        rows, columns = linear_sum_assignment(costs)
+        self._assignment = [[int(u), int(p)] for u, p in zip(fixed_units, fixed_places)] + \
+                           [[int(units[r]), int(places[c])] for r, c in zip(rows, columns)]
+        return float(constant + costs[rows, columns].sum())
+
+    def assignment(self):
+        """
+        solution of the last bound: the fixed pairs and the
+        pairs chosen by the linear assignment problem
+        """
+        return self._assignment
+
+    @staticmethod
+    def __minimal_scalar_products(d, f):
+        """
+        matrix of the minimal scalar products of the rows of d and f
+        without their diagonal entries: d ascending times f descending
+        """
+        m = len(d)
+        off_diagonal = ~np.eye(m, dtype=bool)
+        d_sorted = np.sort(d[off_diagonal].reshape(m, m - 1), axis=1)
+        f_sorted = np.sort(f[off_diagonal].reshape(m, m - 1), axis=1)[:, ::-1]
+        return d_sorted @ f_sorted.T
+
+
+class EigenvalueBound(object):
+    """
+    eigenvalue bound of symmetric instances (Finke, Burkard, Rendl 1987)
+
+    the diagonal terms and the interactions with fixed units are linear
+    costs bounded by a linear assignment problem, the quadratic part
+    d X f X^T of the free units is at least the minimal scalar product
+    of the eigenvalues of d and f without their diagonals
+
+    the bounds are valid for the optima of the symmetric instances:
+
+    >>> import glob, os
+    >>> from functionalities import QAP
+    >>> invalid = []
+    >>> for filename in sorted(glob.glob('qapdat/small/*.dat')):
+    ...     qap = QAP(filename)
+    ...     if qap.is_symmetric() and qap.get_solution() is not None:
+    ...         for bound in (EigenvalueBound, ProjectionBound):
+    ...             value = bound(qap.instance_size(), qap.distance(), qap.intensity()).bound()
+    ...             if value > float(qap.get_solution()) + 1e-6:
+    ...                 invalid.append((qap.name(), bound.__name__))
+    >>> invalid
+    []
+    >>> qap = QAP('qapdat/small/nug12.dat')
+    >>> round(EigenvalueBound(12, qap.distance(), qap.intensity()).bound(), 1)
+    -910.0
+    """
+
+    def __init__(self, n, d, i):
+        """
+        n = instance size
+        d = symmetric distance matrix
+        i = symmetric intensity matrix
+        """
+        self._n = n
+        self._d = np.asarray(d, dtype=float)
+        self._i = np.asarray(i, dtype=float)
+        if not (np.array_equal(self._d, self._d.T) and np.array_equal(self._i, self._i.T)):
+            raise ValueError("eigenvalue bounds need symmetric matrices")
+        self._time = None
+
+    def time(self):
+        """
+        seconds of the last bound
+        """
+        return self._time
+
+    def bound(self, a=[]):
+        """
+        lower bound of all solutions containing the fixed
+        pairs a = [[unit, place], ...] like Model uses them
+        """
+        start = time.perf_counter()
+        d, f = self._d, self._i
+        _, _, units, places, linear, constant = _reduce(self._n, d, f, a)
+        d = d[np.ix_(units, units)] - np.diag(d[units, units])
+        f = f[np.ix_(places, places)] - np.diag(f[places, places])
+        quadratic, linear = self._quadratic(d, f, linear)
+        rows, columns = linear_sum_assignment(linear)
+        self._time = time.perf_counter() - start
+        return float(constant + quadratic + linear[rows, columns].sum())
+
+    def _quadratic(self, d, f, linear):
+        """
+        bound of the quadratic part of the matrices d and f
+        without diagonals and the linear costs that remain
+        """
+        return _minimal_scalar_product(np.linalg.eigvalsh(d), np.linalg.eigvalsh(f)), linear
+
+
+class ProjectionBound(EigenvalueBound):
+    """
+    projection bound of symmetric instances (Hadley, Rendl, Wolkowicz 1992)
+
+    X = e e^T / m + V Y V^T with an orthonormal basis V of the complement
+    of e splits d X f X^T into a constant, the linear costs
+    2 / m (d e)(f e)^T and the quadratic part of V^T d V and V^T f V,
+    whose eigenvalues bound it like in EigenvalueBound; the projected
+    bound is usually much stronger than the basic one
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/nug12.dat')
+    >>> round(ProjectionBound(12, qap.distance(), qap.intensity()).bound(), 1)
+    471.4
+    """
+
+    def _quadratic(self, d, f, linear):
+        """
+        projected eigenvalue bound of the quadratic part and the linear costs with 2 / m (d e)(f e)^T added
+        """
+        m = len(d)
+        if m == 0:
+            return 0.0, linear
+        basis = np.linalg.qr(np.column_stack([np.ones(m), np.eye(m)[:, :-1]]))[0][:, 1:]
+        d_sum, f_sum = d.sum(axis=1), f.sum(axis=1)
+        projected = _minimal_scalar_product(np.linalg.eigvalsh(basis.T @ d @ basis),
+                                            np.linalg.eigvalsh(basis.T @ f @ basis))
+        return projected - d_sum.sum() * f_sum.sum() / m ** 2, linear + 2 / m * np.outer(d_sum, f_sum)
+
+
+def _minimal_scalar_product(x, y):
+    """
+    minimal scalar product of two vectors over all their orders
+    """
+    return float(np.sort(x) @ np.sort(y)[::-1])
+
+
+class DualAscent(object):
+    """
+    dual ascent on the level 1 RLT relaxation of adam_johnson (Hahn, Grant 1998)
+
+    the cost of a permutation p is always lb + sum_i b[i, p_i] +
+    sum_i sum_j!=i c[i, p_i, j, p_j] with nonnegative b and c; every
+    iteration makes the costs of the complementary pairs c[i, k, j, l]
+    and c[j, l, i, k] equal, moves the value of the linear assignment
+    problem of every submatrix c[i, k] into b[i, k], the value of the
+    linear assignment problem of b into lb and spreads what is left of
+    b over the rows of its submatrix again, so lb only grows
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/nug12.dat')
+    >>> ascent = DualAscent(12, qap.distance(), qap.intensity(), iterations=30)
+    >>> 493 < ascent.bound() <= 578
+    True
+    """
+
+    def __init__(self, n, d, i, iterations=50, time_limit=None):
+        """
+        n = instance size
+        d = distance matrix
+        i = intensity matrix
+        iterations = maximal number of iterations of a bound
+        time_limit = maximal seconds of a bound
+        """
+        self._n = n
+        self._d = np.asarray(d, dtype=float)
+        self._i = np.asarray(i, dtype=float)
+        self._iterations = iterations
+        self._time_limit = time_limit
+        self._time = None
+        self._history = []
+
+    def time(self):
+        """
+        seconds of the last bound
+        """
+        return self._time
+
+    def history(self):
+        """
+        lower bound after every iteration of the last bound
+        """
+        return list(self._history)
+
+    def bound(self, a=[]):
+        """
+        lower bound of all solutions containing the fixed
+        pairs a = [[unit, place], ...] like Model uses them
+        """
+        start = time.perf_counter()
+        d, f = self._d, self._i
+        _, _, units, places, linear, lower = _reduce(self._n, d, f, a)
+        d, f = d[np.ix_(units, units)], f[np.ix_(places, places)]
+        m = len(units)
+        self._history = []
+        if m < 2:
+            rows, columns = linear_sum_assignment(linear)
+            self._time = time.perf_counter() - start
+            return float(lower + linear[rows, columns].sum())
+
+        # c[i, k, a, b] is the cost of i -> k and j -> l for the a-th unit j != i
+        # and the b-th place l != k, complement[...] is the index of c[j, l, i, k]
+        others = np.arange(m - 1)[None, :] + (np.arange(m - 1)[None, :] >= np.arange(m)[:, None])
+        c = d[np.arange(m)[:, None], others][:, None, :, None] * f[np.arange(m)[:, None], others][None, :, None, :]
+        i, k = np.arange(m)[:, None, None, None], np.arange(m)[None, :, None, None]
+        j, l = others[:, None, :, None], others[None, :, None, :]
+        complement = (j, l, i - (i > j), k - (k > l))
+        b = linear.copy()
+
+        for _ in range(self._iterations):
+            if self._time_limit is not None and time.perf_counter() - start > self._time_limit:
+                break
+            c = (c + c[complement]) / 2
+            assignments = np.array([linear_sum_assignment(c[unit, place])[1]
+                                    for unit in range(m) for place in range(m)]).reshape(m, m, m - 1)
+            c, values = _reduced_costs(c, assignments)
+            b += values
+            rows, columns = linear_sum_assignment(b)
+            b, value = _reduced_costs(b, columns)
+            lower += value
+            c += b[:, :, None, None] / (m - 1)
+            b = np.zeros_like(b)
+            self._history.append(float(lower))
+        self._time = time.perf_counter() - start
+        return float(lower)
+
+
+def _reduced_costs(costs, assignments):
+    """
+    reduced costs and values of a batch of linear assignment problems
+    costs[..., r, c] with the optimal assignments[..., r]: the column
+    duals v are shortest distances of the difference constraints
+    v_c - v_assignments[r] <= costs[r, c] - costs[r, assignments[r]],
+    the row duals u follow from the assigned entries
+    """
+    m = costs.shape[-1]
+    assigned = np.take_along_axis(costs, assignments[..., None], axis=-1)[..., 0]
+    owner = np.argsort(assignments, axis=-1)
+    weights = np.take_along_axis(costs, owner[..., None], axis=-2) - \
+              np.take_along_axis(assigned, owner, axis=-1)[..., None]
+    v = np.zeros(costs.shape[:-1])
+    for _ in range(m):
+        shorter = np.minimum(v, (v[..., :, None] + weights).min(axis=-2))
+        if np.array_equal(shorter, v):
+            break
+        v = shorter
+    u = assigned - np.take_along_axis(v, assignments, axis=-1)
+    return costs - u[..., :, None] - v[..., None, :], assigned.sum(axis=-1)
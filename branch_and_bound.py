@@ -0,0 +1,227 @@
+"""
+module solving QAP to optimum with branch and bound on partial permutations
+"""
+
+import heapq
+import time
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from algorithm import Algorithm
+from bounds import GilmoreLawler
+
+
+class BranchAndBound(Algorithm):
+    """
+    branch and bound over partial permutations with the Gilmore-Lawler bound
+
+    units are fixed in a static order (most interaction first), a node
+    branches on all free places of the next unit; the constant and the
+    linear costs of a child are updated from its parent and the bounds
+    of all children of a node are computed together
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> algorithm = BranchAndBound()
+    >>> algorithm.solve(qap, None)
+    >>> algorithm.ov, algorithm.is_optimal()
+    (9552.0, True)
+    """
+
+    uses_model = False
+    uses_cutoff = False
+
+    def __init__(self, search='depth', node_limit=None, time_limit=None):
+        """
+        search = 'depth' for depth-first or 'best' for best-first search
+        node_limit = maximum number of branched nodes
+        time_limit = maximum seconds
+        """
+        super().__init__()
+        self._search = search
+        self._node_limit = node_limit
+        self._time_limit = time_limit
+        self._nodes = 0
+        self._lower_bound = None
+        self._optimal = False
+
+    def nodes(self):
+        """
+        number of branched nodes of the last solve
+        """
+        return self._nodes
+
+    def lower_bound(self):
+        """
+        proven lower bound of the last solve, equal to ov if optimal
+        """
+        return self._lower_bound
+
+    def is_optimal(self):
+        """
+        True if the last solve finished within its limits
+        """
+        return self._optimal
+
+    def algorithm(self, instance, model, cutoff=1.0, progress=False):
+        """
+        solve QAP by branch and bound, model and cutoff are not used
+        """
+        start = time.time()
+        n = instance.instance_size()
+        d = np.asarray(instance.distance_array(), dtype=float)
+        f = np.asarray(instance.intensity_array(), dtype=float)
+        self._d, self._f = d, f
+        self._instance = instance
+        self._integral = bool(np.array_equal(d, np.round(d)) and np.array_equal(f, np.round(f)))
+        interaction = d.sum(axis=0) + d.sum(axis=1)
+        order = np.argsort(-interaction, kind='stable')
+
+        glb = GilmoreLawler(n, d, f)
+        root_bound = glb.bound()
+        permutation = np.empty(n, dtype=np.int64)
+        for unit, place in glb.assignment():
+            permutation[unit] = place
+        self._incumbent, self._permutation = self.__local_search(permutation)
+
+        root = (root_bound, 0.0, np.diag(d)[:, None] * np.diag(f)[None, :], [], [])
+        open_nodes = []
+        counter = 0
+        self.__push(open_nodes, root, counter)
+        self._nodes = 0
+        self._optimal = True
+
+        while open_nodes:
+            if (self._node_limit is not None and self._nodes >= self._node_limit) or \
+               (self._time_limit is not None and time.time() - start >= self._time_limit):
+                self._optimal = False
+                break
+            node = self.__pop(open_nodes)
+            if self.__pruned(node[0]):
+                continue
+            self._nodes += 1
+            if progress and self._nodes % 1000 == 0:
+                print("nodes {} open {} incumbent {}".format(self._nodes, len(open_nodes), self._incumbent))
+            children = self.__children(node, order)
+            children.sort(key=lambda child: -child[0])
+            for child in children:
+                counter += 1
+                self.__push(open_nodes, child, counter)
+
+        if self._optimal:
+            self._lower_bound = self._incumbent
+        else:
+            self._lower_bound = min([self._incumbent] + [node[0] for node in open_nodes])
+            if self._integral:
+                self._lower_bound = float(np.ceil(self._lower_bound - 1e-6))
+        self._ov = float(self._incumbent)
+        self._solution = [[float(unit), float(place)] for unit, place in enumerate(self._permutation)]
+
+    def __push(self, open_nodes, node, counter):
+        """
+        """
+        if self._search == 'best':
+            heapq.heappush(open_nodes, (node[0], counter, node))
+        else:
+            open_nodes.append(node)
+
+    def __pop(self, open_nodes):
+        """
+        """
+        if self._search == 'best':
+            return heapq.heappop(open_nodes)[2]
+        return open_nodes.pop()
+
+    def __pruned(self, bound):
+        """
+        True if no completion can improve the incumbent
+        """
+        if self._integral:
+            bound = np.ceil(bound - 1e-6)
+        return bound >= self._incumbent - 1e-6
+
+    def __children(self, node, order):
+        """
+        bounds of all children of node which branch on the next unit
+        of order, complete children update the incumbent
+        """
+        _, constant, linear, fixed_units, fixed_places = node
+        d, f = self._d, self._f
+        n = len(d)
+        unit = int(order[len(fixed_units)])
+        units = np.setdiff1d(np.arange(n), fixed_units)
+        places = np.setdiff1d(np.arange(n), fixed_places)
+        r = int(np.searchsorted(units, unit))
+        m = len(units)
+
+        child_constants = constant + linear[r]
+        if m == 1:
+            self.__update(child_constants[0], fixed_units + [unit], fixed_places + [int(places[0])])
+            return []
+
+        rest = np.delete(np.arange(m), r)
+        child_units = units[rest]
+        # linear[rest][:, s' != s] + interactions with the new fixed pair, for every place s
+        keep = ~np.eye(m, dtype=bool)
+        columns = np.nonzero(keep)[1].reshape(m, m - 1)
+        child_linear = linear[rest][:, columns].transpose(1, 0, 2) \
+                     + d[child_units, unit][None, :, None] * f[places[columns], places[:, None]][:, None, :] \
+                     + d[unit, child_units][None, :, None] * f[places[:, None], places[columns]][:, None, :]
+
+        d_rows = d[np.ix_(child_units, child_units)]
+        d_sorted = np.sort(d_rows[~np.eye(m - 1, dtype=bool)].reshape(m - 1, m - 2), axis=1)
+        # rows of f over the free places sorted descending without the diagonal,
+        # child s removes row s and the entries of column s from the others
+        f_rows = f[np.ix_(places, places)][keep].reshape(m, m - 1)
+        descending = np.argsort(-f_rows, axis=1, kind='stable')
+        f_values = np.take_along_axis(f_rows, descending, axis=1)
+        f_columns = np.take_along_axis(columns, descending, axis=1)
+        other = f_columns[None, :, :] != np.arange(m)[:, None, None]
+        f_sorted = np.broadcast_to(f_values, (m, m, m - 1))[other & keep[:, :, None]].reshape(m, m - 1, m - 2)
+        costs = child_linear + np.einsum('it,skt->sik', d_sorted, f_sorted)
+
+        children = []
+        for s in range(m):
+            rows, cols = linear_sum_assignment(costs[s])
+            bound = child_constants[s] + costs[s][rows, cols].sum()
+            child_units_fixed = fixed_units + [unit]
+            child_places_fixed = fixed_places + [int(places[s])]
+            self.__update_from_assignment(child_units_fixed, child_places_fixed,
+                                          child_units[rows], places[columns[s]][cols])
+            if not self.__pruned(bound):
+                children.append((bound, child_constants[s], child_linear[s], child_units_fixed, child_places_fixed))
+        return children
+
+    def __update_from_assignment(self, fixed_units, fixed_places, units, places):
+        """
+        complete a partial permutation with the assignment of its bound
+        """
+        permutation = np.empty(len(self._d), dtype=np.int64)
+        permutation[fixed_units] = fixed_places
+        permutation[units] = places
+        self.__update(self._instance.cost(permutation), None, None, permutation)
+
+    def __update(self, cost, fixed_units, fixed_places, permutation=None):
+        """
+        replace the incumbent if cost is lower
+        """
+        if cost < self._incumbent - 1e-9:
+            if permutation is None:
+                permutation = np.empty(len(self._d), dtype=np.int64)
+                permutation[fixed_units] = fixed_places
+            self._incumbent, self._permutation = cost, permutation
+
+    def __local_search(self, permutation):
+        """
+        best improving pairwise exchange until no swap improves,
+        returns cost and permutation
+        """
+        instance = self._instance
+        permutation = permutation.copy()
+        cost = instance.cost(permutation)
+        deltas = instance.swap_deltas(permutation)
+        while deltas.min() < -1e-9:
+            r, s = np.unravel_index(np.argmin(deltas), deltas.shape)
+            cost += deltas[r, s]
+            permutation[r], permutation[s] = permutation[s], permutation[r]
+            instance.update_swap_deltas(deltas, permutation, r, s)
+        return instance.cost(permutation), permutation
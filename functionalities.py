@@ -6,8 +6,18 @@ Helper Module
 
 import random
 import csv
+import hashlib
+import json
+import multiprocessing
 import os
+import signal
 import sys
+import tracemalloc
+import numpy as np
+from algorithm import BudgetExceeded
+
+# largest instance size whose dual ascent bound compare computes
+DUAL_ASCENT_MAX_SIZE = 40
 
 
 class RI(object):
@@ -95,30 +105,86 @@ class RI(object):
 class QAP(object):
     """
     initialize QAPlib instance
+
+    the matrices are stored as NumPy arrays, int64 if all values are
+    integral and float64 otherwise; distance() and intensity() still
+    return nested lists of floats
+
+    >>> qap = QAP('qapdat/small/chr12a.dat', cache=False)
+    >>> qap.distance_array().dtype, qap.distance_array().shape
+    (dtype('int64'), (12, 12))
+    >>> qap.distance()[0][:3]
+    [0.0, 90.0, 10.0]
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, cache=True):
         """
         intialize QAPlib instance based on filename
+
+        cache = keep the parsed matrices in a .npy file next to the data
+                file and memory-map it on the next load, the arrays are
+                read-only then
         """
         self.__name = filename.replace('qapdat/', '')
 
+        matrices = self.__load_cache(filename) if cache else None
+        if matrices is None:
+            matrices = self.__parse(filename)
+            if cache:
+                self.__save_cache(filename, matrices)
+
+        self.__instancesize = matrices.shape[1]
+        self.__distance_array = matrices[0]
+        self.__intensity_array = matrices[1]
+        self.__distance = None
+        self.__intensity = None
+
+    @staticmethod
+    def __parse(filename):
+        """
+        read size and both matrices as one (2, n, n) array,
+        the line breaks inside the matrices are ignored
+        """
         with open(filename, 'r', encoding="utf-8") as inputfile:
-            lines = inputfile.readlines()
-            returnlines = []
-            for line in lines:
-                line = line.split()
-                if line:
-                    returnlines.append(line)
-            instancesize = int(returnlines[0][0])
-            distance = returnlines[1:instancesize+1][:]
-            intensity = returnlines[instancesize+1:instancesize*2+1][:]
-            distance = [[float(j) for j in i] for i in distance]
-            intensity = [[float(j) for j in i] for i in intensity]
-
-        self.__instancesize = instancesize
-        self.__distance = distance
-        self.__intensity = intensity
+            tokens = inputfile.read().split()
+        instancesize = int(tokens[0])
+        values = np.array(tokens[1:2 * instancesize ** 2 + 1], dtype=float)
+        if np.array_equal(values, np.round(values)):
+            values = values.astype(np.int64)
+        return values.reshape(2, instancesize, instancesize)
+
+    @staticmethod
+    def __cache_file(filename):
+        """
+        """
+        return os.path.splitext(filename)[0] + '.npy'
+
+    def __load_cache(self, filename):
+        """
+        memory-map the cached matrices, None if there is no
+        cache file or the data file is newer
+        """
+        cache_file = self.__cache_file(filename)
+        try:
+            if os.path.getmtime(cache_file) < os.path.getmtime(filename):
+                return None
+            return np.load(cache_file, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+    def __save_cache(self, filename, matrices):
+        """
+        write the cache file, an unwritable directory is ignored
+        """
+        cache_file = self.__cache_file(filename)
+        temporary = cache_file + '.{}.tmp'.format(os.getpid())
+        try:
+            with open(temporary, 'wb') as outputfile:
+                np.save(outputfile, matrices)
+            os.replace(temporary, cache_file)
+        except OSError:
+            if os.path.exists(temporary):
+                os.remove(temporary)
 
     def __str__(self):
         """
@@ -136,13 +202,29 @@ class QAP(object):
     def distance(self):
         """
         """
+        if self.__distance is None:
+            self.__distance = self.__distance_array.astype(float).tolist()
         return self.__distance
 
     def intensity(self):
         """
         """
+        if self.__intensity is None:
+            self.__intensity = self.__intensity_array.astype(float).tolist()
         return self.__intensity
 
+    def distance_array(self):
+        """
+        distance matrix as NumPy array
+        """
+        return self.__distance_array
+
+    def intensity_array(self):
+        """
+        intensity matrix as NumPy array
+        """
+        return self.__intensity_array
+
     def name(self):
         """
         """
@@ -150,17 +232,118 @@ class QAP(object):
 
     def is_symmetric(self):
         """
-        check if given problem is symmetric
+        check if given problem is symmetric: distance and intensity
+
+        >>> QAP('qapdat/small/chr12a.dat').is_symmetric()
+        True
         """
-        dimension = self.__instancesize
-        if len(self.__distance) != len(self.__distance[0]):
-            return False
-        for row in range(dimension):
-            for column in range(dimension):
-                if self.__distance[row][column] != self.__distance[column][row]:
-                    return False
-        return True
+        return bool(np.array_equal(self.__distance_array, self.__distance_array.T) and
+                    np.array_equal(self.__intensity_array, self.__intensity_array.T))
     
+    def cost(self, permutation):
+        """
+        objective value of a permutation, permutation[unit] = place
+
+        >>> qap = QAP('qapdat/small/chr12a.dat')
+        >>> qap.cost([6, 4, 11, 1, 0, 2, 8, 10, 9, 5, 7, 3])
+        9552.0
+        """
+        p = np.asarray(permutation, dtype=np.int64)
+        return float((self.__distance_array * self.__intensity_array[np.ix_(p, p)]).sum())
+
+    def costs(self, permutations):
+        """
+        objective values of a (k, n) array of permutations
+        """
+        p = np.asarray(permutations, dtype=np.int64)
+        permuted = self.__intensity_array[p[:, :, None], p[:, None, :]]
+        return (self.__distance_array[None, :, :] * permuted).sum(axis=(1, 2)).astype(float)
+
+    def swap_delta(self, permutation, r, s):
+        """
+        change of the objective value if the places of
+        units r and s are exchanged, in O(n)
+
+        >>> qap = QAP('qapdat/small/chr12a.dat')
+        >>> p = [6, 4, 11, 1, 0, 2, 8, 10, 9, 5, 7, 3]
+        >>> qap.swap_delta(p, 0, 1) == qap.cost([4, 6] + p[2:]) - qap.cost(p)
+        True
+        """
+        a, b = self.__distance_array, self.__intensity_array
+        p = np.asarray(permutation, dtype=np.int64)
+        p_r, p_s = p[r], p[s]
+        others = np.ones(len(p), dtype=bool)
+        others[[r, s]] = False
+        k = p[others]
+        delta = ((a[r, others] - a[s, others]) * (b[p_s, k] - b[p_r, k])).sum() \
+              + ((a[others, r] - a[others, s]) * (b[k, p_s] - b[k, p_r])).sum() \
+              + (a[r, r] - a[s, s]) * (b[p_s, p_s] - b[p_r, p_r]) \
+              + (a[r, s] - a[s, r]) * (b[p_s, p_r] - b[p_r, p_s])
+        return float(delta)
+
+    def swap_delta_batch(self, permutations, r, s):
+        """
+        swap_delta for a (k, n) array of permutations exchanging
+        units r[i] and s[i] of permutation i, in O(k n)
+        """
+        a, b = self.__distance_array, self.__intensity_array
+        p = np.asarray(permutations, dtype=np.int64)
+        chains = np.arange(len(p))
+        p_r, p_s = p[chains, r], p[chains, s]
+        columns = np.arange(p.shape[1])
+        others = (columns[None, :] != r[:, None]) & (columns[None, :] != s[:, None])
+        delta = ((a[r] - a[s]) * (b[p_s[:, None], p] - b[p_r[:, None], p]) * others).sum(axis=1) \
+              + ((a[:, r].T - a[:, s].T) * (b[p, p_s[:, None]] - b[p, p_r[:, None]]) * others).sum(axis=1) \
+              + (a[r, r] - a[s, s]) * (b[p_s, p_s] - b[p_r, p_r]) \
+              + (a[r, s] - a[s, r]) * (b[p_s, p_r] - b[p_r, p_s])
+        return delta.astype(float)
+
+    def swap_deltas(self, permutation, rows=None):
+        """
+        matrix of all swap deltas, delta[r][s] = swap_delta(permutation, r, s),
+        only the given rows if rows is not None
+        """
+        a = self.__distance_array.astype(float)
+        p = np.asarray(permutation, dtype=np.int64)
+        b = self.__intensity_array[np.ix_(p, p)].astype(float)
+        n = len(p)
+        rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.int64)
+        a_diagonal, b_diagonal = np.diag(a), np.diag(b)
+        g = (a * b).sum(axis=1)
+        h = (a * b).sum(axis=0)
+        # sums over all k of (a_rk - a_sk)(b_sk - b_rk) + (a_kr - a_ks)(b_ks - b_kr)
+        delta = a[rows] @ b.T + (a @ b[rows].T).T - g[rows, None] - g[None, :] \
+              + a[:, rows].T @ b + (a.T @ b[:, rows]).T - h[rows, None] - h[None, :]
+        # without the terms k = r and k = s, which are replaced by the exact ones
+        a_r, b_r = a_diagonal[rows, None], b_diagonal[rows, None]
+        a_s, b_s = a_diagonal[None, :], b_diagonal[None, :]
+        a_rs, a_sr = a[rows], a.T[rows]
+        b_rs, b_sr = b[rows], b.T[rows]
+        delta -= (a_r - a_sr) * (b_sr - b_r) + (a_rs - a_s) * (b_s - b_rs) \
+               + (a_r - a_rs) * (b_rs - b_r) + (a_sr - a_s) * (b_s - b_sr)
+        delta += (a_r - a_s) * (b_s - b_r) + (a_rs - a_sr) * (b_sr - b_rs)
+        delta[np.arange(len(rows)), rows] = 0
+        return delta
+
+    def update_swap_deltas(self, deltas, permutation, r, s):
+        """
+        update the swap_deltas matrix in place in O(n^2) after units r and s
+        exchanged their places, permutation is the one after the exchange
+        (Taillard 1991)
+        """
+        a, b = self.__distance_array, self.__intensity_array
+        q = np.asarray(permutation, dtype=np.int64)
+        x = (a[r] - a[s]).astype(float)
+        y = (b[q[s], q] - b[q[r], q]).astype(float)
+        x_t = (a[:, r] - a[:, s]).astype(float)
+        y_t = (b[q, q[s]] - b[q, q[r]]).astype(float)
+        deltas += (x[:, None] - x[None, :]) * (y[:, None] - y[None, :]) \
+                + (x_t[:, None] - x_t[None, :]) * (y_t[:, None] - y_t[None, :])
+        exact = self.swap_deltas(q, [r, s])
+        deltas[[r, s], :] = exact
+        deltas[:, [r, s]] = exact.T
+        return deltas
+
     def get_solution(self):
         """
         return known solution value based on .sln files 
@@ -207,9 +390,15 @@ class QAP(object):
 
     def is_solution(self, placed):
         """
-        check if found solution is valid and no place or unit appears twice
+        check if found solution is valid and no place or unit appears twice,
+        placed is a list of [unit, place] or a permutation[unit] = place
 
         >>> from functionalities import *
+        >>> qap = QAP('qapdat/small/chr12a.dat')
+        >>> qap.is_solution([11, 3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 10])
+        True
+        >>> qap.is_solution([11, 3, 0, 1, 2, 4, 5, 6, 7, 8, 9, 9])
+        False
         >>> qap = QAP('qapdat/chr5a.dat')
         >>> solution = [[0, 0], [1, 1], [2, 2], [3, 3], [4, 4]]
         >>> qap.is_solution(solution)
@@ -224,6 +413,8 @@ class QAP(object):
         >>> qap.is_solution(false_solution_two)
         False
         """
+        if np.ndim(placed) == 1:
+            placed = list(enumerate(placed))
         places = []
         units = []
         for pair in placed:
@@ -256,16 +447,60 @@ class QAP(object):
 
         return True
 
-def compare(directory, algorithms, models, cutoff, output_file, verbose = True):
+def compare(directory, algorithms, models, cutoff, output_file, verbose = True, bound = False,
+            workers = 1, timeout = None, cache_dir = None, phases = False, trace_memory = False,
+            memory_limit = None, dual_ascent = 10.0):
     """
     Compares different algorithms.
 
+    Every (instance, model, cutoff, algorithm) combination is one task,
+    the rows of the csv file are written in the order of the instances,
+    models and cutoffs as soon as all their tasks are finished.
+    A failed or timed out task leaves time and ov empty and
+    writes the reason into the solution column.
+
     Arguments:
-    
+    bound -- add the Gilmore-Lawler and dual ascent bound of every
+             instance, the eigenvalue and projection bound of
+             symmetric ones and the gap (ov - bound) / ov of every
+             algorithm, algorithms which prove bounds (e.g. Optimum
+             with a time_limit) also get their own lower bound, node
+             count and optimality
+    dual_ascent -- time_limit of the dual ascent bound of an instance,
+                   None leaves its column empty like instances above
+                   DUAL_ASCENT_MAX_SIZE, whose n^4 costs need too much
+                   memory
+    workers -- number of processes, the tasks of the largest
+               instances are started first, tasks lost because a
+               worker process died are retried
+    timeout -- seconds per task, a task with a timeout runs in its own
+               process group, which is killed with its solver processes
+               when the timeout is reached
+    cache_dir -- directory of a ResultCache, cached cells are reused so
+                 an interrupted sweep resumes where it stopped
+    phases -- add the Algorithm.phases() of every algorithm as json and
+              the variables, rows and nonzeros of its model
+    trace_memory -- trace the memory of the phases with tracemalloc,
+                    which slows down the algorithms
+    memory_limit -- MB for all workers together, checked with the
+                    estimate(instance, model) of algorithms which have one:
+                    tasks above memory_limit are skipped, tasks above
+                    memory_limit / workers are deferred and run one at a
+                    time after the others; adds a note column with the
+                    reason and with Algorithm.note()
+
+    Tasks with the same result_key, e.g. algorithms which ignore
+    the cutoff, are solved once per sweep.
     """
+    from bounds import GilmoreLawler, EigenvalueBound, ProjectionBound, DualAscent
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
     with open(output_file, 'w', newline='') as csvfile:
         csv_writer = csv.writer(csvfile, delimiter=";", quotechar='"', quoting=csv.QUOTE_ALL)
         csv_row = ["QAP instance", "instance size", "optimum", "model", "cutoff"]
+        if bound:
+            csv_row += ["lower bound", "eigenvalue bound", "projection bound", "dual ascent bound"]
 
         for i, algorithm in enumerate(algorithms):
             s = algorithm.name
@@ -273,52 +508,302 @@ def compare(directory, algorithms, models, cutoff, output_file, verbose = True):
             csv_row.append(s + "_" + "time")
             csv_row.append(s + "_" + "ov")
             csv_row.append(s + "_" + "solution")
+            if bound:
+                csv_row.append(s + "_" + "gap")
+                if hasattr(algorithm, 'lower_bound'):
+                    for column in ("lower bound", "nodes", "optimal"):
+                        csv_row.append(s + "_" + column)
+            if phases:
+                for column in ("phases", "variables", "rows", "nonzeros"):
+                    csv_row.append(s + "_" + column)
+            if memory_limit is not None:
+                csv_row.append(s + "_" + "note")
                 
         csv_writer.writerow(csv_row)
         csvfile.flush()
-            
+
+        rows = []
+        instance_bounds = {}
         for dirpath, _, filenames in os.walk(directory):
             filenames.sort()
             for filename in [f for f in filenames if os.path.splitext(f)[1] == '.' + "dat" and not f.startswith('.')]:
                 path = os.path.join(dirpath, filename)
                 qap = QAP(path)
+                lower_bound = None
+                if bound:
+                    lower_bound = GilmoreLawler(qap.instance_size(), qap.distance_array(),
+                                                qap.intensity_array()).bound()
+                    instance_bounds[path] = ["", ""]
+                    if qap.is_symmetric():
+                        instance_bounds[path] = [str(b(qap.instance_size(), qap.distance_array(),
+                                                         qap.intensity_array()).bound())
+                                                   for b in (EigenvalueBound, ProjectionBound)]
+                    instance_bounds[path].append("")
+                    if dual_ascent is not None and qap.instance_size() <= DUAL_ASCENT_MAX_SIZE:
+                        instance_bounds[path][-1] = str(DualAscent(qap.instance_size(), qap.distance_array(),
+                                                                   qap.intensity_array(),
+                                                                   time_limit=dual_ascent).bound())
+                for model in models:
+                    for cut in cutoff:
+                        rows.append((path, qap, model, cut, lower_bound))
+
+        # identical solves are done once, their cells share one key
+        cells = {}
+        for row in range(len(rows)):
+            _, qap, model, cut, _ = rows[row]
+            for i, algorithm in enumerate(algorithms):
+                cells.setdefault(result_key(qap, algorithm, model, cut), []).append((row, i))
+        cache = ResultCache(cache_dir) if cache_dir is not None else None
+        results = {}
+        written = 0
+
+        def finished(key, result, cached=False):
+            """
+            store the result of one task for all its cells and write all complete rows
+            """
+            nonlocal written
+            if cache is not None and not cached and result[3] is None:
+                cache.put(key, result)
+            for row, i in cells[key]:
+                results[row, i] = result
                 if verbose:
-                    print(qap.name() + ":")
+                    status = "OK" if result[3] is None else result[3]
+                    print("{} {} {} {}: {}".format(rows[row][1].name(), algorithms[i].name, rows[row][3],
+                                                   rows[row][2], status + (" (cached)" if cached else "")))
                     sys.stdout.flush()
-
-                for j, model in enumerate(models):
-                    
-                    for k, cut in enumerate(cutoff):
-                        csv_row = [qap.name(), str(qap.instance_size()), str(qap.get_solution())]
-                        csv_row.append(str(model))
-                        csv_row.append(str(cut))
-                        for i, algorithm in enumerate(algorithms):
-                            
-                            if verbose:
-                                print(str(algorithm.name) + " " + str(cut) + " " + str(model) + "...")
-                                sys.stdout.flush()
-                            
-                            algorithm.solve(qap, model, cut, False)
-                            
-                            csv_row.append(str(algorithm.time))
-                            csv_row.append(str(algorithm.ov))
-                            csv_row.append(str(algorithm.solution))
-                            
-                            if verbose:
-                                print("OK", end="")
-                                sys.stdout.flush()
-                                if i < len(algorithms) - 1:
-                                    print(", ", end="")
-                                    sys.stdout.flush()
-                                else:
-                                    print("")
-                                    sys.stdout.flush()
-                            
-                        csv_writer.writerow(csv_row)
-                        csvfile.flush()
+            while written < len(rows) and all((written, i) in results for i in range(len(algorithms))):
+                path, qap, model, cut, lower_bound = rows[written]
+                csv_row = [qap.name(), str(qap.instance_size()), str(qap.get_solution())]
+                csv_row.append(str(model))
+                csv_row.append(str(cut))
+                if bound:
+                    csv_row.append(str(lower_bound))
+                    csv_row += instance_bounds[path]
+                for i in range(len(algorithms)):
+                    time, ov, solution, error, details = results.pop((written, i))
+                    csv_row.append("" if error else str(time))
+                    csv_row.append("" if error else str(ov))
+                    csv_row.append(error if error else str(solution))
+                    if bound:
+                        csv_row.append("" if error else str(gap(ov, lower_bound)))
+                        if hasattr(algorithms[i], 'lower_bound'):
+                            search = details.get('search') or {}
+                            for column in ("lower bound", "nodes", "optimal"):
+                                csv_row.append(str(search.get(column, "")))
+                    if phases:
+                        size = details.get('model size') or {}
+                        csv_row.append(json.dumps(details.get('phases', {}), sort_keys=True))
+                        for column in ("variables", "rows", "nonzeros"):
+                            csv_row.append(str(size.get(column, "")))
+                    if memory_limit is not None:
+                        csv_row.append(details.get('note') or "")
+                csv_writer.writerow(csv_row)
+                csvfile.flush()
+                written += 1
+
+        tasks = []
+        deferred = []
+        for key, keyed_cells in cells.items():
+            result = cache.get(key) if cache is not None else None
+            if result is not None:
+                finished(key, result, True)
+                continue
+            row, i = keyed_cells[0]
+            path, qap, model, cut, _ = rows[row]
+            task = (key, path, algorithms[i], model, cut, qap.instance_size())
+            memory = None
+            if memory_limit is not None and hasattr(algorithms[i], 'estimate'):
+                memory = algorithms[i].estimate(qap, model)['memory']
+            if memory is None or memory <= memory_limit / workers:
+                tasks.append(task)
+            elif memory <= memory_limit:
+                deferred.append(task)
+            else:
+                reason = "skipped: estimated {:.3g} MB > {} MB".format(memory, memory_limit)
+                finished(key, (None, None, None, reason, {'note': reason}))
+
+        def pool(tasks, processes):
+            """
+            run tasks in a new pool of processes, returns the tasks which
+            were lost because a worker process died and broke the pool
+            """
+            lost = []
+            tasks.sort(key=lambda task: -task[5])
+            with ProcessPoolExecutor(processes) as executor:
+                futures = {}
+                for task in tasks:
+                    key, path, algorithm, model, cut, _ = task
+                    try:
+                        futures[executor.submit(compare_task, path, algorithm, model, cut, timeout,
+                                                trace_memory)] = task
+                    except BrokenProcessPool:
+                        lost.append(task)
+                for future in as_completed(futures):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        lost.append(futures[future])
+                        continue
+                    except Exception as exception:
+                        result = (None, None, None, "error: {}: {}".format(type(exception).__name__, exception), {})
+                    finished(futures[future][0], result)
+            return lost
+
+        # the deferred tasks run alone, in a separate process if workers > 1
+        for tasks, processes in ((tasks, workers), (deferred, 1)):
+            if workers == 1:
+                for key, path, algorithm, model, cut, _ in tasks:
+                    finished(key, compare_task(path, algorithm, model, cut, timeout, trace_memory))
+                continue
+            # a dying worker, e.g. killed for its memory, breaks the whole pool,
+            # the lost tasks are retried in a new one and then one at a time,
+            # so only the task which kills its worker again is an error
+            lost = pool(tasks, processes)
+            if lost:
+                lost = pool(lost, processes)
+            for task in lost:
+                for key, *_ in pool([task], 1):
+                    finished(key, (None, None, None, "error: the worker process died", {}))
 
     return
 
+def result_key(qap, algorithm, model, cut):
+    """
+    hash of the instance matrices, the algorithm with its parameters,
+    the model and the cutoff, model and cutoff are left out if the
+    algorithm does not use them
+    """
+    digest = hashlib.sha256()
+    for matrix in (qap.distance_array(), qap.intensity_array()):
+        digest.update(np.ascontiguousarray(matrix, dtype=np.float64).tobytes())
+    digest.update(json.dumps([qap.instance_size(), algorithm.name, algorithm.parameters(),
+                              str(model) if algorithm.uses_model else None,
+                              float(cut) if algorithm.uses_cutoff else None], sort_keys=True).encode())
+    return digest.hexdigest()
+
+class ResultCache(object):
+    """
+    results of compare tasks in a directory, one json file per result_key
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     cache = ResultCache(directory)
+    ...     cache.put('abc', (0.5, 9552.0, [[0.0, 6.0]], None, {}))
+    ...     cache.get('abc'), cache.get('abd')
+    ((0.5, 9552.0, [[0.0, 6.0]], None, {}), None)
+    """
+    def __init__(self, directory):
+        """
+        """
+        self.__directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def __filename(self, key):
+        """
+        """
+        return os.path.join(self.__directory, key + '.json')
+
+    def get(self, key):
+        """
+        cached (time, ov, solution, None, details) or None
+        """
+        try:
+            with open(self.__filename(key), 'r', encoding="utf-8") as inputfile:
+                result = json.load(inputfile)
+        except (OSError, ValueError):
+            return None
+        return result['time'], result['ov'], result['solution'], None, result.get('details', {})
+
+    def put(self, key, result):
+        """
+        store a successful result
+        """
+        time, ov, solution, _, details = result
+        filename = self.__filename(key)
+        temporary = filename + '.{}.tmp'.format(os.getpid())
+        with open(temporary, 'w', encoding="utf-8") as outputfile:
+            json.dump({'time': time, 'ov': ov, 'solution': solution, 'details': details}, outputfile)
+        os.replace(temporary, filename)
+
+def compare_task(path, algorithm, model, cut, timeout=None, trace_memory=False):
+    """
+    solve one compare task, returns (time, ov, solution, error, details)
+    where error is None or the reason of the failure and details
+    contains the phases and the model size of the algorithm and
+    the lower bound, nodes and optimality of algorithms proving bounds;
+    with a timeout the task runs in a child process in its own process
+    group, which is killed together with the solver processes it
+    started, e.g. CBC, if the timeout is reached, so native solvers
+    like HiGHS are stopped as well
+    """
+    if timeout is None:
+        return _solve_task(path, algorithm, model, cut, trace_memory)
+    receiver, sender = multiprocessing.Pipe(False)
+    process = multiprocessing.Process(target=_task_process,
+                                      args=(sender, path, algorithm, model, cut, trace_memory))
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            return None, None, None, "timeout after {} s".format(timeout), {}
+        try:
+            return receiver.recv()
+        except EOFError:
+            process.join()
+            return None, None, None, "error: the task process exited with code {}".format(process.exitcode), {}
+    finally:
+        receiver.close()
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+        except (AttributeError, OSError):
+            process.kill()
+        process.join()
+
+def _task_process(sender, path, algorithm, model, cut, trace_memory):
+    """
+    child process of a compare task with a timeout, sends its result
+    """
+    if hasattr(os, 'setpgid'):
+        os.setpgid(0, 0)
+    sender.send(_solve_task(path, algorithm, model, cut, trace_memory))
+    sender.close()
+
+def _solve_task(path, algorithm, model, cut, trace_memory):
+    """
+    result of compare_task in this process
+    """
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        algorithm.solve(QAP(path), model, cut, False)
+        details = {'phases': algorithm.phases(), 'model size': algorithm.model_size(), 'note': algorithm.note()}
+        if hasattr(algorithm, 'lower_bound'):
+            details['search'] = {'lower bound': algorithm.lower_bound(), 'nodes': algorithm.nodes(),
+                                 'optimal': algorithm.is_optimal()}
+        return algorithm.time, algorithm.ov, algorithm.solution, None, details
+    except BudgetExceeded as exception:
+        return None, None, None, "skipped: {}".format(exception), {'note': "skipped: {}".format(exception)}
+    except Exception as exception:
+        return None, None, None, "error: {}: {}".format(type(exception).__name__, exception), {}
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+
+def gap(ov, lower_bound):
+    """
+    relative gap between an objective value and a lower bound
+
+    >>> round(gap(9552.0, 7245.0), 4)
+    0.2415
+    >>> gap(0.0, 0.0)
+    0.0
+    """
+    if ov is None:
+        return None
+    if ov == lower_bound:
+        return 0.0
+    return (float(ov) - lower_bound) / abs(float(ov))
+
 def comparison_graph(input_csv, ov_column, compare_column, filename=""):
     """
     create comparison graph
@@ -410,6 +895,30 @@ def place_units(x_vars, cut_off):
                 placed_units.append(name)
     return placed_units
 
+def place_x_values(values, cut_off):
+    """
+    place_units for an n x n array of x values: pairs are placed in
+    descending order of their value while it reaches cut_off if neither
+    their unit nor their place is taken, returns the integer array
+    permutation[unit] = place with -1 for units which are not placed
+
+    >>> place_x_values(np.array([[0.2, 0.8], [0.6, 0.4]]), 0.5).tolist()
+    [1, 0]
+    >>> place_x_values(np.array([[0.2, 0.8], [0.6, 0.4]]), 0.7).tolist()
+    [1, -1]
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    permutation = np.full(n, -1, dtype=np.int64)
+    taken = np.zeros(n, dtype=bool)
+    order = np.argsort(-values, axis=None, kind='stable')
+    order = order[values.ravel()[order] >= cut_off]
+    for unit, place in zip(*np.divmod(order, n)):
+        if permutation[unit] < 0 and not taken[place]:
+            permutation[unit] = place
+            taken[place] = True
+    return permutation
+
 def create_new_instance(distance_instance, notPlaced):
     """
     get distance or instance matrix of 
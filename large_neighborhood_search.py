@@ -0,0 +1,179 @@
+"""
+module solving QAP heuristically by re-optimizing subsets of units with the linearized models
+"""
+
+import time
+import numpy as np
+import pulp
+from algorithm import Algorithm, start_permutation
+from lp_models import Model
+from sparse_models import SparseModel
+from functionalities import place_x_values
+
+# how the units which are freed are chosen
+SELECTIONS = ('random', 'cost')
+
+
+class LargeNeighborhoodSearch(Algorithm):
+    """
+    large neighborhood search: k units of the current permutation are
+    freed, every other unit keeps its place as a fixed edge of Model,
+    so the model is the reduced QAP of k units, which is solved exactly
+    with the current permutation as MIP start and its objective value
+    as cutoff; a better permutation replaces the current one
+
+    k starts at k_min and grows by one after patience subproblems
+    without improvement up to k_max, a subproblem which hits
+    subproblem_time_limit shrinks it by one
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> algorithm = LargeNeighborhoodSearch(iterations=20, seed=0)
+    >>> algorithm.solve(qap, 'adam_johnson')
+    >>> start = qap.cost(np.random.default_rng(0).permutation(12))
+    >>> algorithm.ov < start, qap.is_solution(algorithm.solution), len(algorithm.history())
+    (True, True, 20)
+    """
+
+    uses_cutoff = False
+
+    def __init__(self, start=None, backend='pulp', selection='cost', k_min=4, k_max=8, patience=5,
+                 iterations=None, time_limit=None, subproblem_time_limit=None, seed=None):
+        """
+        start = permutation[unit] = place or an Algorithm, e.g.
+                RobustTabuSearch, whose solution is the first permutation,
+                a random permutation if None
+        backend = 'pulp' (CBC) or 'sparse' (HiGHS) like Optimum
+        selection = 'random' frees k random units, 'cost' draws them
+                    with probabilities proportional to their share
+                    of the cost of the current permutation
+        k_min, k_max = range of the number of freed units
+        patience = subproblems without improvement before k grows
+        iterations = number of subproblems, 2 n if neither
+                     iterations nor time_limit are given
+        time_limit = maximum seconds
+        subproblem_time_limit = maximum seconds of one subproblem
+        seed = seed of the random start and the selections
+        """
+        super().__init__()
+        if selection not in SELECTIONS:
+            raise ValueError("selection is one of {}".format(', '.join(SELECTIONS)))
+        if backend not in ('pulp', 'sparse'):
+            raise ValueError("backend is 'pulp' or 'sparse'")
+        self._start = start
+        self._backend = backend
+        self._selection = selection
+        self._k_min = k_min
+        self._k_max = k_max
+        self._patience = patience
+        self._iterations = iterations
+        self._time_limit = time_limit
+        self._subproblem_time_limit = subproblem_time_limit
+        self._seed = seed
+        self._history = []
+
+    def history(self):
+        """
+        one dictionary per subproblem of the last solve: number of freed
+        units, objective value afterwards and whether it improved
+        """
+        return [dict(record) for record in self._history]
+
+    def algorithm(self, instance, model, cutoff=1.0, progress=False):
+        """
+        re-optimize subsets of units with model, cutoff is not used
+        """
+        start = time.time()
+        n = instance.instance_size()
+        generator = np.random.default_rng(self._seed)
+        iterations = self._iterations
+        if iterations is None and self._time_limit is None:
+            iterations = 2 * n
+
+        with self.phase('start'):
+            permutation = start_permutation(self._start, instance, progress)
+        if permutation is None:
+            permutation = generator.permutation(n)
+        cost = instance.cost(permutation)
+        k = min(self._k_min, n)
+        failures = 0
+        self._history = []
+        while (iterations is None or len(self._history) < iterations) and \
+              (self._time_limit is None or time.time() - start < self._time_limit):
+            units = self.__select(instance, permutation, k, generator)
+            limit = self._subproblem_time_limit
+            if self._time_limit is not None:
+                remaining = max(0.0, self._time_limit - (time.time() - start))
+                limit = remaining if limit is None else min(limit, remaining)
+            candidate, finished = self.__reoptimize(instance, model, permutation, units, limit, progress)
+            improved = False
+            if candidate is not None and instance.cost(candidate) < cost - 1e-9 * max(1.0, abs(cost)):
+                permutation, cost, improved = candidate, instance.cost(candidate), True
+                failures = 0
+            else:
+                failures += 1
+            if not finished and k > 2:
+                k, failures = k - 1, 0
+            elif failures >= self._patience and k < min(self._k_max, n):
+                k, failures = k + 1, 0
+            self._history.append({'k': len(units), 'ov': cost, 'improved': improved})
+            if progress:
+                print("subproblem {}: {} units, ov {}".format(len(self._history), len(units), cost))
+
+        self._ov = cost
+        self._solution = [[float(unit), float(place)] for unit, place in enumerate(permutation)]
+
+    def __select(self, instance, permutation, k, generator):
+        """
+        k units to free
+        """
+        n = instance.instance_size()
+        if self._selection == 'random':
+            return np.sort(generator.choice(n, k, replace=False))
+        d, f = instance.distance_array(), instance.intensity_array()
+        # cost of the pairs of unit i: sum_j d_ij f_p(i)p(j) + d_ji f_p(j)p(i)
+        pairs = d * f[np.ix_(permutation, permutation)]
+        shares = pairs.sum(axis=1) + pairs.sum(axis=0) + 1e-9
+        return np.sort(generator.choice(n, k, replace=False, p=shares / shares.sum()))
+
+    def __reoptimize(self, instance, model, permutation, units, limit, progress):
+        """
+        best permutation which only moves units among their places or None
+        if the solver finds nothing better, and whether the solver finished
+        """
+        n = instance.instance_size()
+        free = set(units.tolist())
+        a = [[unit, int(place)] for unit, place in enumerate(permutation) if unit not in free]
+        if self._backend == 'sparse':
+            m = SparseModel(n, instance.distance_array(), instance.intensity_array(), False, a,
+                            False, instance.is_symmetric())
+            with self.phase('build'):
+                result = getattr(m, model)()
+            with self.phase('solve'):
+                status = result.solve(progress, time_limit=limit)
+            if result.objective_value() is None:
+                return None, status != 'Not Solved'
+            return self.__placed(result.x_values()), status == 'Optimal'
+
+        m = Model(n, instance.distance(), instance.intensity(), False, a, False, instance.is_symmetric())
+        with self.phase('build'):
+            result = getattr(m, model)()
+        values, objective = m.start(model, permutation)
+        for variable in result.variables():
+            variable.setInitialValue(values.get(variable.name, 0.0), check=False)
+        # the cutoff excludes the current permutation, so CBC only returns better ones
+        options = ['cutoff {}'.format(objective - 1e-6 * max(1.0, abs(objective)))]
+        with self.phase('solve'):
+            result.solve(pulp.PULP_CBC_CMD(msg=progress, timeLimit=limit, warmStart=True, options=options))
+        finished = result.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionInfeasible)
+        if result.sol_status not in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+            return None, finished
+        return self.__placed(m.x_values()), finished
+
+    @staticmethod
+    def __placed(values):
+        """
+        permutation of integral x values, None if a unit is not placed
+        """
+        permutation = place_x_values(values, 0.5)
+        return None if (permutation < 0).any() else permutation
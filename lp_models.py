@@ -4,32 +4,444 @@
 This module defines the Basis class for classes
 containing one solution algorithm.
 """
+import collections
+import functools
+import itertools
+import numpy as np
 import pulp
 
+# coefficients of n^4, n^3, n^2, n, 1 of the variables, rows and nonzeros
+# of every formulation without fixed edges and without s
+SIZES = {
+    'adam_johnson': ((1, -2, 2, 0, 0), (0.5, 1, -1.5, 2, 0), (3, -4, 3, 0, 0)),
+    'aimms': ((1, -2, 2, 0, 0), (2, -4, 2, 2, 0), (5, -10, 7, 0, 0)),
+    'fireze_yadegar': ((1, 0, 1, 0, 0), (0, 4, 1, 2, 0), (4, 4, 4, 0, 0)),
+    'kaufman_broeckx': ((0, 0, 2, 0, 0), (0, 0, 1, 2, 0), (1, -2, 5, 0, 0)),
+    'lawler': ((1, 0, 1, 0, 0), (1, 0, 0, 2, 1), (4, 0, 1, 0, 0)),
+    'padberg': ((0.5, -1, 1.5, 0, 0), (0.5, 1, -4.5, 5, -1), (2.5, -6, 5.5, -1, 0)),
+}
+
+# measured bytes and seconds per nonzero while building a model
+BUILD_COSTS = {
+    'pulp': (450, 25e-6),
+    'sparse': (100, 1e-6),
+    'lp': (350, 16e-6),
+}
+
+# kinds of the indices of the y variables, u = unit, p = place,
+# formulations which are missing use uupp
+Y_INDICES = {'adam_johnson': 'upup', 'kaufman_broeckx': 'up'}
+
+# formulations whose objective contains the terms d_ii f_kk
+DIAGONAL = ('kaufman_broeckx', 'lawler')
+
+# number of instances whose coefficient stores are kept, see coefficients()
+CACHE_SIZE = 4
+_stores = collections.OrderedDict()
+
+class Coefficients(object):
+    """
+    coefficient tensors of one instance as read-only arrays,
+    each one is computed when it is used the first time
+
+    >>> store = coefficients([[0, 2], [3, 0]], [[0, 1], [4, 0]])
+    >>> float(store.outer()[0, 1, 1, 0]), float(store.symmetrized()[0, 1, 1, 0]), store.row_sums().tolist()
+    (8.0, 11.0, [[2.0, 8.0], [3.0, 12.0]])
+    >>> store is coefficients([[0, 2], [3, 0]], [[0, 1], [4, 0]])
+    True
+    """
+    def __init__(self, d, f):
+        """
+        d = distance matrix
+        f = intensity matrix
+        """
+        self.d = np.array(d, dtype=float)
+        self.f = np.array(f, dtype=float)
+        self.d.setflags(write=False)
+        self.f.setflags(write=False)
+        self.__tensors = {}
+
+    def outer(self):
+        """
+        outer()[i, j, k, l] = d_ij f_kl
+        """
+        return self.__tensor('outer', lambda: self.d[:, :, None, None] * self.f[None, None, :, :])
+
+    def symmetrized(self):
+        """
+        symmetrized()[i, j, k, l] = d_ij f_kl + d_ji f_lk
+        """
+        return self.__tensor('symmetrized', lambda: self.outer() + self.outer().transpose(1, 0, 3, 2))
+
+    def row_sums(self):
+        """
+        row_sums()[i, k] = sum_jl d_ij f_kl
+        """
+        return self.__tensor('row sums', lambda: np.outer(self.d.sum(axis=1), self.f.sum(axis=1)))
+
+    def __tensor(self, name, compute):
+        """
+        """
+        if name not in self.__tensors:
+            tensor = compute()
+            tensor.setflags(write=False)
+            self.__tensors[name] = tensor
+        return self.__tensors[name]
+
+def coefficients(d, f):
+    """
+    shared Coefficients of the matrices d and f, the stores
+    of the last CACHE_SIZE instances are kept
+    """
+    d, f = np.asarray(d, dtype=float), np.asarray(f, dtype=float)
+    key = (d.shape, d.tobytes(), f.tobytes())
+    store = _stores.pop(key, None)
+    if store is None:
+        store = Coefficients(d, f)
+    _stores[key] = store
+    while len(_stores) > CACHE_SIZE:
+        _stores.popitem(last=False)
+    return store
+
+def _reducible(formulation):
+    """
+    decorator of the formulations: with fixed edges the
+    formulation is built for the reduced QAP, see Model._reduce
+    """
+    @functools.wraps(formulation)
+    def build(self, *args, **kwargs):
+        if len(self._a) == 0:
+            return formulation(self, *args, **kwargs)
+        return self._reduce(formulation.__name__, *args, **kwargs)
+    return build
+
 class Model(object):
     """
     """
-    def __init__(self, n, d, i, r=False, a=[]):
+    def __init__(self, n, d, i, r=False, a=[], s=False, m=None, z=[]):
         """
         n = instance size
         d = distance matrix
         i = intensity matrix
         r = relax variables
         a = fixed edges
+        s = skip y variables with zero cost
+        m = merge y variables which describe the same product of x,
+            None merges them if d and i are symmetric
+        z = edges fixed to 0
+
+        With s only the y variables with nonzero cost and their linking rows
+        are created. aimms, lawler and kaufman_broeckx stay exact: the rows of
+        a skipped y only bound that y, lawler replaces its aggregated row
+        sum(y) == n^2 by y_ijkl >= x_ik + x_jl - 1 for every kept y.
+        In adam_johnson, fireze_yadegar and padberg a linking equality
+        sum(y) == x that lost a term is relaxed to sum(y) <= x and dropped
+        if no term is left, every kept y gets the row y >= x + x - 1 of
+        its product like in lawler, so the models stay exact as long as
+        d and i are nonnegative, minimizing pushes y down to the product;
+        their LP relaxations stay weaker than without s.
+        reduction() reports the removed variables and rows.
+
+        With a the formulation is built for the reduced QAP of the free
+        units and places only: the costs between free and fixed units
+        become costs of the x variables, the costs between fixed units a
+        constant of the objective. The variables keep the names of the
+        full instance and the fixed x_ij are added with x_ij == 1.
+
+        With m y_ijkl and y_jilk = x_ik x_jl (y_klij = x_ij x_kl in
+        adam_johnson) become one variable with the sum of both costs, the
+        rows which are duplicates afterwards are not created; aimms,
+        fireze_yadegar, lawler and adam_johnson lose about half of their
+        y variables, padberg has only i < j anyway.
+
+        With z the x_ij of the edges get the upper bound 0 and the y
+        variables which are a product with one of them are not created,
+        they are 0 in every solution, so the rows stay exact and only
+        lose these terms; they count as removed variables in reduction().
         """
         self._n = n
         self._d = d
         self._i = i
         self._r = r
         self._a = a
+        self._s = s
+        self._m = m
+        self._z = z
+        self._coefficients = None
+        self._x = None
+        self._linear = None
+        self._labels = None
+        self._reduction = self._new_reduction()
+
+    def _new_reduction(self):
+        """
+        empty report of removed variables and rows
+        """
+        self._reduction = {'variables removed': 0, 'rows removed': 0, 'rows added': 0,
+                           'variables merged': 0, 'rows merged': 0, 'exact': True}
+        return self._reduction
+
+    def _store(self):
+        """
+        shared coefficient store of d and i, see coefficients()
+        """
+        if self._coefficients is None:
+            self._coefficients = coefficients(self._d, self._i)
+        return self._coefficients
+
+    def _merging(self):
+        """
+        True if y variables of partner quadruples are merged
+        """
+        if self._m is not None:
+            return self._m
+        d, f = self._store().d, self._store().f
+        return bool(np.array_equal(d, d.T) and np.array_equal(f, f.T))
+
+    def _zeros(self):
+        """
+        n x n array which is True for the edges fixed to 0
+        """
+        zeros = np.zeros((self._n, self._n), dtype=bool)
+        for element in self._z:
+            zeros[int(element[0]), int(element[1])] = True
+        return zeros
+
+    def _nonnegative(self):
+        """
+        True if d and i have no negative entry, then no y has a negative cost
+        """
+        return bool((self._store().d >= 0).all() and (self._store().f >= 0).all())
+
+    def _zero(self, kind):
+        """
+        n^4 array which is True for the quadruples whose y is a product
+        with an x fixed to 0, kind is the kind of the y indices, see Y_INDICES
+        """
+        zeros = self._zeros()
+        if kind == 'upup':
+            return zeros[:, :, None, None] | zeros[None, None, :, :]
+        return zeros[:, None, :, None] | zeros[None, :, None, :]
+
+    def _subproblem(self, formulation):
+        """
+        model of the reduced QAP of the free units and places with the
+        same options, its _linear holds the costs of the x variables and
+        its _labels the indices of the full instance; returns the model
+        and the constant of the objective
+
+        >>> d, f = [[0, 2, 1], [2, 0, 3], [1, 3, 0]], [[0, 1, 4], [1, 0, 2], [4, 2, 0]]
+        >>> sub, constant = Model(3, d, f, False, [[1, 0]])._subproblem('aimms')
+        >>> sub._labels['x'], sub._linear.tolist(), constant
+        ((array([0, 2]), array([1, 2])), [[4.0, 16.0], [6.0, 24.0]], 0.0)
+        """
+        n = self._n
+        d, f = self._store().d, self._store().f
+        fixed_units = np.array([int(element[0]) for element in self._a])
+        fixed_places = np.array([int(element[1]) for element in self._a])
+        units = np.setdiff1d(np.arange(n), fixed_units)
+        places = np.setdiff1d(np.arange(n), fixed_places)
+
+        linear = (d[np.ix_(units, fixed_units)] @ f[np.ix_(places, fixed_places)].T
+                  + d[np.ix_(fixed_units, units)].T @ f[np.ix_(fixed_places, places)])
+        fixed = d[np.ix_(fixed_units, fixed_units)] * f[np.ix_(fixed_places, fixed_places)]
+        constant = float(fixed.sum() if formulation in DIAGONAL else fixed.sum() - np.trace(fixed))
+
+        # edges fixed to 0 in the rows or columns of fixed edges are 0 anyway
+        z = [[int(np.searchsorted(units, element[0])), int(np.searchsorted(places, element[1]))]
+             for element in self._z if int(element[0]) in units and int(element[1]) in places]
+        sub = self.__class__(len(units), d[np.ix_(units, units)], f[np.ix_(places, places)],
+                             self._r, [], self._s, self._m, z)
+        sub._linear = linear
+        sub._labels = {'x': (units, places),
+                       'y': tuple(units if kind == 'u' else places for kind in Y_INDICES.get(formulation, 'uupp'))}
+        return sub, constant
+
+    def _label(self, name):
+        """
+        name of a variable of a reduced model in the full instance
+        """
+        if self._labels is None:
+            return name
+        prefix, *indices = name.split('_')
+        return '_'.join([prefix] + [str(labels[int(index)])
+                                    for labels, index in zip(self._labels[prefix], indices)])
+
+    def _reduce(self, formulation, *args, **kwargs):
+        """
+        build formulation for the reduced QAP and embed it into the full instance
+        """
+        sub, constant = self._subproblem(formulation)
+        problem = getattr(sub, formulation)(*args, **kwargs)
+        self._reduction = sub.reduction()
+        return self._embed(problem, sub, constant)
+
+    def _embed(self, qap, sub, constant):
+        """
+        add the costs of the x variables and the constant of the reduced
+        model sub to its objective, rename its variables to the indices
+        of the full instance and add the fixed x variables
+        """
+        variables = qap.variablesDict()
+        qap.objective += pulp.lpSum(float(sub._linear[i][k]) * variables['x_{}_{}'.format(i, k)]
+                                    for i in range(sub._n) for k in range(sub._n)
+                                    if sub._linear[i][k] != 0) + constant
+        for variable in qap.variables():
+            variable.name = sub._label(variable.name)
+        cat = pulp.LpContinuous if self._r else pulp.LpBinary
+        x_ij = collections.defaultdict(dict)
+        for element in self._a:
+            i, k = int(element[0]), int(element[1])
+            x_ij[i][k] = pulp.LpVariable('x_{}_{}'.format(i, k), cat=cat, lowBound=0, upBound=1)
+            # without free units pulp would add a dummy variable without value to the objective
+            qap.objective.addterm(x_ij[i][k], 0)
+        self.__set_ones(qap, x_ij)
+        units, places = sub._labels['x']
+        for i in range(sub._n):
+            for k in range(sub._n):
+                x_ij[units[i]][places[k]] = sub._x[i][k]
+        self._x = x_ij
+        return qap
+
+    def estimate(self, formulation, backend='pulp'):
+        """
+        closed form size of a formulation before building it:
+        variables, rows and nonzeros (exact for instances with zero
+        diagonals and nonzero off-diagonal entries, an upper bound with z,
+        not with s, which adds a row for every kept y of some formulations)
+        and memory in MB and build seconds for backend 'pulp', 'sparse'
+        (SparseModel) or 'lp' (SparseModel with LPWriter)
+
+        >>> Model(20, [], []).estimate('aimms')['variables']
+        144800
+        """
+        n = self._n - len(self._a)
+        variables, rows, nonzeros = (sum(c * n ** (4 - e) for e, c in enumerate(coefficients))
+                                     for coefficients in SIZES[formulation])
+        if backend == 'pulp':
+            variables += len(self._a)
+            rows += len(self._a)
+            nonzeros += len(self._a)
+        elif formulation == 'padberg':
+            # SparseModel keeps y >= 0 of padberg as bounds
+            rows -= 0.5 * n ** 4 - n ** 3 + 0.5 * n ** 2
+            nonzeros -= 0.5 * n ** 4 - n ** 3 + 0.5 * n ** 2
+        memory, seconds = BUILD_COSTS[backend]
+        return {'variables': int(variables), 'rows': int(rows), 'nonzeros': int(nonzeros),
+                'memory': nonzeros * memory / 2 ** 20, 'build seconds': nonzeros * seconds}
+
+    def start(self, formulation, permutation):
+        """
+        nonzero values of the variables of formulation by name which
+        describe the solution permutation[unit] = place, and the
+        objective value of formulation for them, e.g. for a MIP start
+
+        >>> d, f = [[0, 2, 1], [2, 0, 3], [1, 3, 0]], [[0, 1, 4], [1, 0, 2], [4, 2, 0]]
+        >>> values, objective = Model(3, d, f).start('kaufman_broeckx', [2, 0, 1])
+        >>> sorted(values.items()), objective
+        ([('x_0_2', 1.0), ('x_1_0', 1.0), ('x_2_1', 1.0), ('y_0_2', 10.0), ('y_1_0', 11.0), ('y_2_1', 5.0)], 26.0)
+        >>> values, objective = Model(3, d, f).start('padberg', [2, 0, 1])
+        >>> sorted(name for name in values if name.startswith('y')), objective
+        (['y_0_1_2_0', 'y_0_2_2_1', 'y_1_2_0_1'], 26.0)
+        >>> Model(3, d, f, False, [[1, 0]]).start('kaufman_broeckx', [2, 0, 1])[1]
+        26.0
+        """
+        n = self._n
+        permutation = [int(place) for place in permutation]
+        if len(self._a) > 0:
+            sub, constant = self._subproblem(formulation)
+            units, places = sub._labels['x']
+            reduced = np.searchsorted(places, [permutation[unit] for unit in units])
+            values, objective = sub.start(formulation, reduced)
+            values = {sub._label(name): value for name, value in values.items()}
+            for element in self._a:
+                values['x_{}_{}'.format(int(element[0]), int(element[1]))] = 1.0
+            return values, objective + float(sub._linear[np.arange(sub._n), reduced].sum()) + constant
+        d = self._store().d
+        f = self._store().f[np.ix_(permutation, permutation)]
+        values = {'x_{}_{}'.format(i, permutation[i]): 1.0 for i in range(n)}
+        if formulation == 'kaufman_broeckx':
+            for i, value in enumerate((d * f).sum(axis=1)):
+                if value != 0:
+                    values['y_{}_{}'.format(i, permutation[i])] = float(value)
+            return values, float((d * f).sum())
+
+        for i, j in itertools.product(range(n), repeat=2):
+            if formulation == 'adam_johnson':
+                values['y_{}_{}_{}_{}'.format(i, permutation[i], j, permutation[j])] = 1.0
+            elif formulation != 'padberg' or i < j:
+                values['y_{}_{}_{}_{}'.format(i, j, permutation[i], permutation[j])] = 1.0
+        if formulation == 'lawler':
+            return values, float((d * f).sum())
+        return values, float((d * f).sum() - np.trace(d * f))
+
+    def x_values(self):
+        """
+        n x n array of the values of the x variables of the last built
+        pulp formulation after it was solved, x_ij which are not part of
+        a reduced model are 0, None if no formulation was built
+
+        >>> d, f = [[0, 2, 1], [2, 0, 3], [1, 3, 0]], [[0, 1, 4], [1, 0, 2], [4, 2, 0]]
+        >>> model = Model(3, d, f, False, [[1, 0]])
+        >>> _ = model.kaufman_broeckx().solve(pulp.PULP_CBC_CMD(msg=False))
+        >>> model.x_values().tolist()
+        [[0.0, 0.0, 1.0], [1.0, 0.0, 0.0], [0.0, 1.0, 0.0]]
+        """
+        if self._x is None:
+            return None
+        values = np.zeros((self._n, self._n))
+        for i, row in self._x.items():
+            for k, x in row.items():
+                values[i, k] = np.nan if x.varValue is None else x.varValue
+        return values
+
+    def reduced_costs(self):
+        """
+        n x n array of the reduced costs of the x variables of the last
+        built pulp formulation after its relaxation was solved, x_ij
+        which conflict with a fixed edge are inf, the fixed ones 0
+
+        the bound plus the reduced cost of x_ij bounds every permutation
+        with x_ij = 1, which is what reduced cost fixing relies on:
+
+        >>> from functionalities import QAP
+        >>> qap = QAP('qapdat/small/chr12a.dat')
+        >>> d, f = qap.distance_array()[:5, :5], qap.intensity_array()[:5, :5]
+        >>> model = Model(5, d, f, True)
+        >>> problem = model.adam_johnson()
+        >>> _ = problem.solve(pulp.PULP_CBC_CMD(msg=False))
+        >>> best = np.full((5, 5), np.inf)
+        >>> for p in itertools.permutations(range(5)):
+        ...     best[range(5), p] = np.minimum(best[range(5), p], (d * f[np.ix_(p, p)]).sum())
+        >>> problem.objective.value(), bool((problem.objective.value() + model.reduced_costs() <= best).all())
+        (7550.0, True)
+        """
+        if self._x is None:
+            return None
+        costs = np.full((self._n, self._n), np.inf)
+        for i, row in self._x.items():
+            for k, x in row.items():
+                costs[i, k] = np.nan if x.dj is None else x.dj
+        for element in self._a:
+            costs[int(element[0]), int(element[1])] = 0.0
+        return costs
+
+    def reduction(self):
+        """
+        removed y variables and rows of the last built formulation
+        compared to the formulation without s
+        """
+        return dict(self._reduction)
 
     """
 
     Standard Linearizations including constraints for already fixed edges
     """
+    @_reducible
     def adam_johnson(self):
         """
         """
+        self._new_reduction()
         qap = pulp.LpProblem('QAP', pulp.LpMinimize)
         if self._r:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
@@ -40,21 +452,16 @@ class Model(object):
                                                     range(self._n)),
             cat=pulp.LpBinary, lowBound=0)
 
-        y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                             range(self._n), range(self._n), range(self._n)),
-        cat=pulp.LpContinuous, lowBound=0)
-
-        c_ijkl = [[[[0 for i in range(self._n)] for j in range(self._n)] for k in range(self._n)] for l in range(self._n)]
+        # c_ijkl = d_ik f_jl
+        c_ijkl = self._store().outer().transpose(0, 2, 1, 3).tolist()
 
-        for i in range(self._n):
-            for j in range(self._n):
-                for k in range(self._n):
-                    for l in range(self._n):
-                        c_ijkl[i][j][k][l] = float(self._d[i][k]) * float(self._i[j][l])
+        merge = self._merging()
+        y_ijkl = self.__y_variables(lambda i, j, k, l: j != l and i != k, lambda i, j, k, l: c_ijkl[i][j][k][l],
+        lambda i, j, k, l: (k, l, i, j), 'upup', cat=pulp.LpContinuous, lowBound=0)
 
         qap += (pulp.lpSum(y_ijkl[i][j][k][l] * c_ijkl[i][j][k][l]
                     for i in range(self._n) for j in range(self._n) 
-                    for k in range(self._n) for l in range(self._n) if j != l and i != k),
+                    for k in range(self._n) for l in range(self._n) if j != l and i != k and l in y_ijkl[i][j][k]),
         'objective function')
 
         for i in range(self._n):
@@ -69,14 +476,14 @@ class Model(object):
             for k in range(self._n):
                 for l in range(self._n):
                     if j != l:
-                        qap += (pulp.lpSum(y_ijkl[i][j][k][l] for i in range(self._n) if i != k)  == x_ij[k][l],
+                        self.__linking(qap, y_ijkl, [(i, j, k, l) for i in range(self._n) if i != k], x_ij[k][l],
                                     'lin 1 {} {} {}'.format(j, k, l))
 
         for i in range(self._n):
             for k in range(self._n):
                 for l in range(self._n):
                     if i != k:
-                        qap += (pulp.lpSum(y_ijkl[i][j][k][l] for j in range(self._n) if j != l)  == x_ij[k][l],
+                        self.__linking(qap, y_ijkl, [(i, j, k, l) for j in range(self._n) if j != l], x_ij[k][l],
                                     'lin 2 {} {} {}'.format(i, k, l))
 
         for i in range(self._n):
@@ -84,37 +491,50 @@ class Model(object):
                 for k in range(self._n):
                     for l in range(self._n):
                         if i < k and j != l:
-                            qap += (y_ijkl[i][j][k][l] == y_ijkl[k][l][i][j],
+                            if merge:
+                                self._reduction['rows merged'] += 1
+                            elif l in y_ijkl[i][j][k] and j in y_ijkl[k][l][i]:
+                                qap += (y_ijkl[i][j][k][l] == y_ijkl[k][l][i][j],
                                         'lin 3 {} {} {} {}'.format(i, j, k, l))
-
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+                            elif self.__y_zero[i, j, k, l]:
+                                self._reduction['rows removed'] += 1
+                            else:
+                                self._reduction['rows removed'] += 1
+                                self._reduction['exact'] = False
+
+        self.__products(qap, y_ijkl, x_ij, lambda i, j, k, l: ((i, j), (k, l)), lambda i, j, k, l: (k, l, i, j))
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
 
+    @_reducible
     def aimms(self):
         """
         """
+        self._new_reduction()
+        c_ijkl = self._store().outer().tolist()
+        used = lambda i, j, k, l: i != j and k != l
+        cost = lambda i, j, k, l: c_ijkl[i][j][k][l]
+        partner = lambda i, j, k, l: (j, i, l, k)
+        merge = self._merging()
         if self._r:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                                 range(self._n)),
             cat=pulp.LpContinuous, lowBound=0, upBound=1)
-            y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                    range(self._n), range(self._n), range(self._n)),
+            y_ijkl = self.__y_variables(used, cost, partner,
             cat=pulp.LpContinuous, lowBound=0, upBound=1)
         else:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                                     range(self._n)),
             cat=pulp.LpBinary, lowBound=0, upBound=1)
-            y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                    range(self._n), range(self._n), range(self._n)),
+            y_ijkl = self.__y_variables(used, cost, partner,
             cat=pulp.LpBinary, lowBound=0, upBound=1)
 
         qap = pulp.LpProblem('QAP', pulp.LpMinimize)
 
-        qap += (pulp.lpSum(y_ijkl[i][j][k][l] * float(self._d[i][j]) * float(self._i[k][l])
+        qap += (pulp.lpSum(y_ijkl[i][j][k][l] * c_ijkl[i][j][k][l]
                 for i in range(self._n) for j in range(self._n) if i != j
-                for k in range(self._n) for l in range(self._n) if k != l),
+                for k in range(self._n) for l in range(self._n) if k != l and l in y_ijkl[i][j][k]),
             'objective function')
 
 
@@ -132,27 +552,34 @@ class Model(object):
             for j in range(self._n):
                 for k in range(self._n):
                     for l in range(self._n):
-                        if (i != j and l != k):
+                        if (i != j and l != k and l in y_ijkl[i][j][k]):
                             qap += (y_ijkl[i][j][k][l] <= x_ij[i][k],
                             'lin {} {} {} {}'.format(i, j, k, l))
+                        elif (i != j and l != k):
+                            self._reduction['rows removed'] += 1
 
 
         for i in range(self._n):
             for j in range(self._n):
                 for k in range(self._n):
                     for l in range(self._n):
-                        if (i != j and l != k):
+                        if (i != j and l != k and merge and i > j):
+                            self._reduction['rows merged'] += 1
+                        elif (i != j and l != k and l in y_ijkl[i][j][k]):
                             qap += (y_ijkl[i][j][k][l] >= x_ij[i][k] + x_ij[j][l] - 1,
                                         'lin 2 {} {} {} {}'.format(i, j, k, l))
+                        elif (i != j and l != k):
+                            self._reduction['rows removed'] += 1
 
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
 
+    @_reducible
     def fireze_yadegar(self):
         """
         """
+        self._new_reduction()
         if self._r:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                              range(self._n)),
@@ -162,15 +589,17 @@ class Model(object):
                                                 range(self._n)),
             cat=pulp.LpBinary, lowBound=0)
         
-        y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                range(self._n), range(self._n), range(self._n)),
-        cat=pulp.LpContinuous, lowBound=0, upBound=1)
+        merge = self._merging()
+        c_ijkl = self._store().outer().tolist()
+        y_ijkl = self.__y_variables(lambda i, j, k, l: True,
+        lambda i, j, k, l: c_ijkl[i][j][k][l] if i != j and k != l else 0,
+        lambda i, j, k, l: (j, i, l, k), cat=pulp.LpContinuous, lowBound=0, upBound=1)
 
         qap = pulp.LpProblem('QAP', pulp.LpMinimize)
 
-        qap += (pulp.lpSum(y_ijkl[i][j][k][l] * float(self._d[i][j]) * float(self._i[k][l])
+        qap += (pulp.lpSum(y_ijkl[i][j][k][l] * c_ijkl[i][j][k][l]
                    for i in range(self._n) for j in range(self._n) if i != j
-                   for k in range(self._n) for l in range(self._n) if k != l),
+                   for k in range(self._n) for l in range(self._n) if k != l and l in y_ijkl[i][j][k]),
             'objective function')
     
         for i in range(self._n):
@@ -183,48 +612,57 @@ class Model(object):
                  'column: {}'.format(j))
 
 
+        # with merged y lin 1 and lin 3 repeat lin 2 and lin 4
         for j in range(self._n):
             for k in range(self._n):
                 for l in range(self._n):
-                    qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for i in range(self._n))) == x_ij[j][l],
+                    if merge:
+                        self._reduction['rows merged'] += 1
+                        continue
+                    self.__linking(qap, y_ijkl, [(i, j, k, l) for i in range(self._n)], x_ij[j][l],
                     'lin 1 {} {} {}'.format(j, k, l))
 
 
         for i in range(self._n):
             for k in range(self._n):
                 for l in range(self._n):
-                    qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for j in range(self._n))) == x_ij[i][k],
+                    self.__linking(qap, y_ijkl, [(i, j, k, l) for j in range(self._n)], x_ij[i][k],
                     'lin 2 {} {} {}'.format(i, k, l))
 
 
         for i in range(self._n):
             for j in range(self._n):
                 for l in range(self._n):
-                    qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for k in range(self._n))) == x_ij[j][l],
+                    if merge:
+                        self._reduction['rows merged'] += 1
+                        continue
+                    self.__linking(qap, y_ijkl, [(i, j, k, l) for k in range(self._n)], x_ij[j][l],
                     'lin 3 {} {} {}'.format(i, j, l))
 
 
         for i in range(self._n):
             for j in range(self._n):
                 for k in range(self._n):
-                    qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for l in range(self._n))) == x_ij[i][k],
+                    self.__linking(qap, y_ijkl, [(i, j, k, l) for l in range(self._n)], x_ij[i][k],
                     'lin 4 {} {} {}'.format(i, j, k))
 
 
 
         for i in range(self._n):
             for k in range(self._n):
-                qap += (y_ijkl[i][i][k][k] == x_ij[i][k],
+                self.__linking(qap, y_ijkl, [(i, i, k, k)], x_ij[i][k],
                 'lin 5 {} {}'.format(i, k))
 
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+        self.__products(qap, y_ijkl, x_ij, lambda i, j, k, l: ((i, k), (j, l)), lambda i, j, k, l: (j, i, l, k))
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
     
+    @_reducible
     def kaufman_broeckx(self):
         """
         """
+        self._new_reduction()
 
         if self._r:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
@@ -239,14 +677,8 @@ class Model(object):
                                                 range(self._n)),
         cat=pulp.LpContinuous, lowBound=0)
 
-        d_ik = [[0 for i in range(self._n)] for k in range(self._n)] 
-
-        for i in range(self._n):
-            for k in range(self._n):
-                d_ik[i][k] = (pulp.lpSum(
-                    float(self._d[i][j]) * float(self._i[k][l])
-                    for j in range(self._n)
-                    for l in range(self._n)))
+        d_ik = self._store().row_sums().tolist()
+        c_ijkl = self._store().outer().tolist()
 
 
 
@@ -270,53 +702,50 @@ class Model(object):
 
         for i in range(self._n):
             for k in range(self._n):
-                    qap += ((d_ik[i][k] * x_ij[i][k]) + pulp.lpSum(float(self._d[i][j]) * float(self._i[k][l]) * x_ij[j][l]
+                    qap += ((d_ik[i][k] * x_ij[i][k]) + pulp.lpSum(c_ijkl[i][j][k][l] * x_ij[j][l]
                                 for j in range(self._n)
-                                for l in range(self._n)) - y_ik[i][k] <= d_ik[i][k],
+                                for l in range(self._n)
+                                if not self._s or c_ijkl[i][j][k][l] != 0) - y_ik[i][k] <= d_ik[i][k],
                                 'dik_constant {} {}'.format(i, k))
 
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
 
+    @_reducible
     def lawler(self):
         """
         Solve QAP ILP linearized with Lawler (1963)
         """
+        self._new_reduction()
+
+        c_ijkl = self._store().outer().tolist()
+
+        used = lambda i, j, k, l: True
+        cost = lambda i, j, k, l: c_ijkl[i][j][k][l]
+        partner = lambda i, j, k, l: (j, i, l, k)
+        merge = self._merging()
 
         if self._r: 
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                                     range(self._n)),
             cat=pulp.LpContinuous, lowBound=0)
             
-            y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                    range(self._n), range(self._n), range(self._n)),
-            cat=pulp.LpContinuous)
+            y_ijkl = self.__y_variables(used, cost, partner,
+            cat=pulp.LpContinuous, lowBound=0 if self._s else None)
         else:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                                     range(self._n)),
             cat=pulp.LpBinary, lowBound=0)
             
-            y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                    range(self._n), range(self._n), range(self._n)),
+            y_ijkl = self.__y_variables(used, cost, partner,
             cat=pulp.LpBinary)
 
-        c_ijkl = [[[[0 for i in range(self._n)] for j in range(self._n)] for k in range(self._n)] for l in range(self._n)]
-
-        for i in range(self._n):
-            for j in range(self._n):
-                for k in range(self._n):
-                    for l in range(self._n):
-                        c_ijkl[i][j][k][l] = float(self._d[i][j]) * float(self._i[k][l])
-
-
-
         qap = pulp.LpProblem('QAP', pulp.LpMinimize)
 
         qap += (pulp.lpSum(y_ijkl[i][j][k][l] * float(c_ijkl[i][j][k][l])
                     for i in range(self._n) for j in range(self._n)
-                    for k in range(self._n) for l in range(self._n)),
+                    for k in range(self._n) for l in range(self._n) if l in y_ijkl[i][j][k]),
         'objective function')
     
         for i in range(self._n):
@@ -327,27 +756,41 @@ class Model(object):
             qap += (pulp.lpSum(x_ij[i][j] for i in range(self._n)) == 1,
                     'column: {}'.format(j))
 
-        qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for i in range(self._n) for j in range(self._n)
-                                    for k in range(self._n) for l in range(self._n) ))
+        if not self._s:
+            qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for i in range(self._n) for j in range(self._n)
+                                    for k in range(self._n) for l in range(self._n) if l in y_ijkl[i][j][k]))
                                     == ((self._n)**2), 'lin 1')
+        else:
+            self._reduction['rows removed'] += 1
+            for i, j, k, l in itertools.product(range(self._n), repeat=4):
+                if l in y_ijkl[i][j][k] and not (merge and partner(i, j, k, l) < (i, j, k, l)):
+                    qap += (y_ijkl[i][j][k][l] >= x_ij[i][k] + x_ij[j][l] - 1,
+                    'lin 1 {} {} {} {}'.format(i, j, k, l))
+                    self._reduction['rows added'] += 1
         
         for i in range(self._n):
             for j in range(self._n):
                 for k in range(self._n):
                     for l in range(self._n):
-                        qap += (x_ij[i][k] + x_ij[j][l] - 2 * y_ijkl[i][j][k][l] >= 0,
-                        'lin 2 {} {} {} {}'.format(i, j, k, l))
+                        if merge and partner(i, j, k, l) < (i, j, k, l):
+                            self._reduction['rows merged'] += 1
+                        elif l in y_ijkl[i][j][k]:
+                            qap += (x_ij[i][k] + x_ij[j][l] - 2 * y_ijkl[i][j][k][l] >= 0,
+                            'lin 2 {} {} {} {}'.format(i, j, k, l))
+                        else:
+                            self._reduction['rows removed'] += 1
 
         
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
 
+    @_reducible
     def padberg(self):
         """
         
         """
+        self._new_reduction()
         if self._r:
             x_ij = pulp.LpVariable.dicts('x_%s_%s', (range(self._n),
                                                 range(self._n)),
@@ -357,23 +800,16 @@ class Model(object):
                                                     range(self._n)),
             cat=pulp.LpBinary, lowBound=0)
         
-        y_ijkl = pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
-                                                range(self._n), range(self._n), range(self._n)),
-        cat=pulp.LpContinuous, lowBound=0)
+        q_ijkl = self._store().symmetrized().tolist()
 
-        q_ijkl = [[[[0 for i in range(self._n)] for j in range(self._n)] for k in range(self._n)] for l in range(self._n)] 
-
-        for i in range(self._n):
-            for j in range(self._n):
-                for k in range(self._n):
-                    for l in range(self._n):
-                        q_ijkl[i][j][k][l] = float(self._d[i][j]) * float(self._i[k][l]) + float(self._d[j][i]) * float(self._i[l][k])
+        y_ijkl = self.__y_variables(lambda i, j, k, l: i < j and k != l, lambda i, j, k, l: q_ijkl[i][j][k][l],
+        cat=pulp.LpContinuous, lowBound=0)
 
         qap = pulp.LpProblem('QAP', pulp.LpMinimize)
 
         qap += (pulp.lpSum(y_ijkl[i][j][k][l] * q_ijkl[i][j][k][l]
                         for i in range(self._n) for j in range(self._n) if i < j
-                        for k in range(self._n) for l in range(self._n) if k != l),
+                        for k in range(self._n) for l in range(self._n) if k != l and l in y_ijkl[i][j][k]),
                         'objective function')
     
         for i in range(self._n):
@@ -391,8 +827,8 @@ class Model(object):
                 for l in range(self._n):
                     n = self._n - 1
                     if (k != l and j <= n - 1) or (l < k and j == n):
-                        qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for i in range(j))) +
-                                (pulp.lpSum(y_ijkl[j][i][l][k] for i in range(j+1, self._n))) == x_ij[j][l],
+                        self.__linking(qap, y_ijkl, [(i, j, k, l) for i in range(j)] +
+                                [(j, i, l, k) for i in range(j+1, self._n)], x_ij[j][l],
                         'lin 1 {} {} {}'.format(j, k, l))
 
 
@@ -402,8 +838,8 @@ class Model(object):
                     n = self._n - 1
                     if ((i <= n - 3 and i < j and j <=  n - 1) 
                         or (k <= n - 1 and i == n - 2 and j == n - 1)):
-                        qap += ((pulp.lpSum(y_ijkl[i][j][k][l] for l in range(k))) +
-                                (pulp.lpSum(y_ijkl[i][j][k][l] for l in range(k+1, self._n))) == x_ij[i][k],
+                        self.__linking(qap, y_ijkl, [(i, j, k, l) for l in range(k)] +
+                                [(i, j, k, l) for l in range(k+1, self._n)], x_ij[i][k],
                         'lin 2 {} {} {}'.format(j, k, i))
 
 
@@ -412,8 +848,8 @@ class Model(object):
                 for k in range(self._n):
                     n = self._n - 1
                     if (k <= n - 1 and i <= n - 3 and i < j and j <= n - 1):
-                        qap += ((pulp.lpSum(y_ijkl[i][j][l][k] for l in range(k))) +
-                                (pulp.lpSum(y_ijkl[i][j][l][k] for l in range(k + 1, self._n))) == x_ij[j][k],
+                        self.__linking(qap, y_ijkl, [(i, j, l, k) for l in range(k)] +
+                                [(i, j, l, k) for l in range(k + 1, self._n)], x_ij[j][k],
                         'lin 3 {} {} {}'.format(j, k, i))
 
 
@@ -422,22 +858,104 @@ class Model(object):
                 for k in range(self._n): 
                     for l in range(self._n):
                         n = self._n - 1
-                        if(i < j and j <= n and k != l):
+                        if(i < j and j <= n and k != l and l in y_ijkl[i][j][k]):
                             qap += y_ijkl[i][j][k][l] >= 0
+                        elif(i < j and j <= n and k != l):
+                            self._reduction['rows removed'] += 1
 
-
-        if len(self._a) > 0:
-            self.__set_ones(qap, x_ij)
-
+        self.__products(qap, y_ijkl, x_ij, lambda i, j, k, l: ((i, k), (j, l)))
+        self.__set_zeros(x_ij)
+        self._x = x_ij
         return qap
     
 
+    """
+    Variables and linking rows for the option s
+    """
+    def __y_variables(self, used, cost, partner=None, kind='uupp', **kwargs):
+        """
+        create y_ijkl for all quadruples, with s only for the
+        quadruples used by the formulation which have a nonzero cost;
+        partner gives the quadruple with the same product of x, if they
+        are merged the smaller one creates the variable for both and
+        its cost is the sum of both; with z the quadruples whose y is a
+        product with an x fixed to 0 are left out, see _zero(kind)
+        """
+        merge = partner is not None and self._merging()
+        self.__y_zero = self._zero(kind)
+        if not self._s and not merge and len(self._z) == 0:
+            return pulp.LpVariable.dicts('y_%s_%s_%s_%s', (range(self._n),
+                                         range(self._n), range(self._n), range(self._n)), **kwargs)
+
+        y_ijkl = {i: {j: {k: {} for k in range(self._n)} for j in range(self._n)} for i in range(self._n)}
+        for i, j, k, l in itertools.product(range(self._n), repeat=4):
+            if not used(i, j, k, l):
+                continue
+            if self.__y_zero[i, j, k, l]:
+                self._reduction['variables removed'] += 1
+                continue
+            c = cost(i, j, k, l)
+            if merge:
+                a, b, e, g = partner(i, j, k, l)
+                if (a, b, e, g) < (i, j, k, l):
+                    if g in y_ijkl[a][b][e]:
+                        y_ijkl[i][j][k][l] = y_ijkl[a][b][e][g]
+                    self._reduction['variables merged'] += 1
+                    continue
+                if (a, b, e, g) != (i, j, k, l):
+                    c += cost(a, b, e, g)
+            if not self._s or c != 0:
+                y_ijkl[i][j][k][l] = pulp.LpVariable('y_{}_{}_{}_{}'.format(i, j, k, l), **kwargs)
+            else:
+                self._reduction['variables removed'] += 1
+        return y_ijkl
+
+    def __linking(self, qap, y_ijkl, quadruples, x, name):
+        """
+        add sum(y) == x over the given quadruples,
+        relaxed to <= if a y was skipped and dropped if no y is left,
+        the y left out by z are 0 and keep the row exact
+        """
+        y = [y_ijkl[i][j][k][l] for i, j, k, l in quadruples if l in y_ijkl[i][j][k]]
+        if len(y) == len(quadruples) - sum(bool(self.__y_zero[quadruple]) for quadruple in quadruples):
+            qap += (pulp.lpSum(y) == x, name)
+            return
+        self._reduction['exact'] = False
+        if y:
+            qap += (pulp.lpSum(y) <= x, name)
+        else:
+            self._reduction['rows removed'] += 1
+
+    def __products(self, qap, y_ijkl, x_ij, product, partner=None):
+        """
+        with s add y >= x_ab + x_eg - 1 for every kept y, whose product
+        x_ab x_eg is given by product, merged y get one row; they restore
+        the linking rows which __linking relaxed for nonnegative costs
+        """
+        if not self._s:
+            return
+        merge = partner is not None and self._merging()
+        for i, j, k, l in itertools.product(range(self._n), repeat=4):
+            if l in y_ijkl[i][j][k] and not (merge and partner(i, j, k, l) < (i, j, k, l)):
+                (a, b), (e, g) = product(i, j, k, l)
+                qap += (y_ijkl[i][j][k][l] >= x_ij[a][b] + x_ij[e][g] - 1,
+                        'product {} {} {} {}'.format(i, j, k, l))
+                self._reduction['rows added'] += 1
+        self._reduction['exact'] = self._reduction['exact'] or self._nonnegative()
+
     """
     Additional constraints for already placed pairs
     """
+    def __set_zeros(self, x_ij):
+        """
+        bound the x_ij of the edges fixed to 0
+        """
+        for element in self._z:
+            x_ij[int(element[0])][int(element[1])].upBound = 0
+
     def __set_ones(self, qap, x_ij):
         """
-        set already chosen xij to 1
+        set already chosen xij to 1, x_ij holds at least the fixed edges
         """
         for element in self._a:
             qap += (x_ij[int(element[0])][int(element[1])] == 1,
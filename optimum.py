@@ -2,10 +2,18 @@
 module solving QAP to optimum without any relaxations but using linearized models
 """
 
-from algorithm import Algorithm
+from algorithm import Algorithm, BudgetExceeded, start_permutation
 from lp_models import Model
-from functionalities import get_sorted_x_vars, place_units
+from sparse_models import SparseModel, LPWriter, read_solver_log
+from functionalities import place_x_values, gap
+import os
+import tempfile
+import numpy as np
 import pulp
+from scipy.optimize import linear_sum_assignment
+
+# solvers of every backend, the first one is the default
+SOLVERS = {'pulp': ('cbc', 'glpk', 'highs'), 'sparse': ('highs',), 'lp': ('cbc',)}
 
 class Optimum(Algorithm):
     """
@@ -13,20 +21,296 @@ class Optimum(Algorithm):
     only for small problems
     """
 
-    def __init__(self):
+    uses_cutoff = False
+
+    def __init__(self, backend='pulp', solver=None, threads=None, time_limit=None, gap_rel=None, gap_abs=None,
+                 start=None, memory_limit=None, build_time_limit=None, downgrade=False, fixing=False):
         """
         initialize optimum algorithm
+
+        backend = 'pulp' builds the model with pulp and solves it with CBC,
+                  'sparse' builds it with SparseModel and solves it with HiGHS,
+                  'lp' streams it with SparseModel into an LP file solved by CBC
+        solver = None for the default solver of the backend or one of
+                 SOLVERS[backend], the pulp backend can also use the
+                 'glpk' and 'highs' command line solvers if installed
+        threads = number of solver threads
+        time_limit = wall clock seconds after which the solver stops
+        gap_rel, gap_abs = relative and absolute gap at which the solver stops
+        start = permutation[unit] = place or an Algorithm, e.g. RobustTabuSearch,
+                whose solution is expanded with Model.start into a MIP start
+                and whose objective value is the cutoff of the solver
+        memory_limit = MB the model may need while it is built
+        build_time_limit = seconds the model may need to be built
+        downgrade = if the estimate of Model.estimate exceeds a limit, use
+                    the other backends and then kaufman_broeckx instead of
+                    raising BudgetExceeded
+        fixing = solve the relaxation of the model first and fix every
+                 x_ij to 0 whose reduced cost added to the bound of the
+                 relaxation exceeds the objective value of the start, or
+                 without start of the relaxation rounded to a permutation
+                 by a LAP, which then is the start; only the pruned model
+                 (Model z) is solved, eliminated() reports the fixed x_ij
+
+        HiGHS through scipy ignores threads, gap_abs and the MIP start,
+        GLPK ignores them as well; the start is the solution if the
+        solver does not find a better one; after a solve status(), lower_bound(), nodes(), mip_gap()
+        and is_optimal() report how far the solver got, a solve stopped
+        before the solver found a solution leaves ov and solution None
+        and note() tells so
         """
         super().__init__()
+        if solver is not None and solver not in SOLVERS[backend]:
+            raise ValueError("backend {} supports the solvers {}".format(backend, ', '.join(SOLVERS[backend])))
+        self._backend = backend
+        self._solver = solver
+        self._threads = threads
+        self._time_limit = time_limit
+        self._gap_rel = gap_rel
+        self._gap_abs = gap_abs
+        self._start = start
+        self._memory_limit = memory_limit
+        self._build_time_limit = build_time_limit
+        self._downgrade = downgrade
+        self._fixing = fixing
+        self._eliminated = None
+        self._status = None
+        self._lower_bound = None
+        self._nodes = None
+
+    def status(self):
+        """
+        status message of the solver of the last solve
+        """
+        return self._status
+
+    def lower_bound(self):
+        """
+        dual bound of the last solve, equal to ov if optimal
+        """
+        return self._lower_bound
+
+    def eliminated(self):
+        """
+        number of x_ij which reduced cost fixing fixed to 0 in the last solve
+        """
+        return self._eliminated
+
+    def nodes(self):
+        """
+        number of branch and bound nodes of the last solve
+        """
+        return self._nodes
+
+    def mip_gap(self):
+        """
+        relative gap (ov - lower_bound) / ov of the last solve
+        """
+        if self._lower_bound is None:
+            return None
+        return gap(self._ov, self._lower_bound)
+
+    def is_optimal(self):
+        """
+        True if the lower bound of the last solve reaches ov
+        """
+        return self._ov is not None and self._lower_bound is not None and \
+            self._lower_bound >= self._ov - 1e-6 * max(1.0, abs(self._ov))
+
+    def estimate(self, instance, model, backend=None):
+        """
+        Model.estimate of model for instance
+        """
+        m = Model(instance.instance_size(), [], [], False, [])
+        return m.estimate(model, backend or self._backend)
+
+    def __exceeded(self, estimate):
+        """
+        reason why an estimate exceeds the limits or None
+        """
+        if self._memory_limit is not None and estimate['memory'] > self._memory_limit:
+            return "estimated {:.3g} MB > {} MB".format(estimate['memory'], self._memory_limit)
+        if self._build_time_limit is not None and estimate['build seconds'] > self._build_time_limit:
+            return "estimated {:.0f} s > {} s".format(estimate['build seconds'], self._build_time_limit)
+        return None
+
+    def __admit(self, instance, model):
+        """
+        backend and model within the limits
+        """
+        reason = self.__exceeded(self.estimate(instance, model))
+        if reason is None:
+            return self._backend, model
+        if self._downgrade:
+            backends = [self._backend]
+            if self._solver is None:
+                backends += [b for b in ('sparse', 'lp') if b != self._backend]
+            for backend, formulation in [(b, model) for b in backends[1:]] + \
+                                        [(b, 'kaufman_broeckx') for b in backends]:
+                if self.__exceeded(self.estimate(instance, formulation, backend)) is None:
+                    self._note = "downgraded to {} {}: {} {} {}".format(backend, formulation,
+                                                                     self._backend, model, reason)
+                    return backend, formulation
+        raise BudgetExceeded("{} {}: {}".format(self._backend, model, reason))
 
     def algorithm(self, instance, model, cutoff=1.0, progress=False):
         """
         solve QAP without relaxation to the optimum
         """
 
-        m = Model(instance.instance_size(), instance.distance(), instance.intensity(), False, [])
-        result = getattr(m, model)()
-        result.solve()
-        self._ov = result.objective.value()
-        x_vars = get_sorted_x_vars(result)
-        self._solution = place_units(x_vars, 1)
+        self._status, self._lower_bound, self._nodes, self._eliminated = None, None, None, None
+        backend, model = self.__admit(instance, model)
+        permutation = self.__start_permutation(instance, progress)
+        z = []
+        if self._fixing:
+            with self.phase('fixing'):
+                z, permutation = self.__fixing(instance, backend, model, permutation, progress)
+        start, start_objective, limit = None, None, None
+        limits = {'threads': self._threads, 'time_limit': self._time_limit,
+                  'gap_rel': self._gap_rel, 'gap_abs': self._gap_abs}
+        if backend in ('sparse', 'lp'):
+            m = SparseModel(instance.instance_size(), instance.distance_array(), instance.intensity_array(), False, [],
+                            False, instance.is_symmetric(), z)
+            if permutation is not None:
+                start, start_objective = m.start(model, permutation)
+                limit = start_objective + 1e-6 * max(1.0, abs(start_objective))
+            with tempfile.TemporaryDirectory() as directory:
+                with self.phase('build'):
+                    if backend == 'lp':
+                        result = getattr(m, model)(LPWriter(os.path.join(directory, 'qap.lp')))
+                    else:
+                        result = getattr(m, model)()
+                self._model_size = {'variables': result.num_variables(), 'rows': result.num_rows(),
+                                    'nonzeros': result.num_nonzeros()}
+                with self.phase('solve'):
+                    result.solve(progress, start=start, cutoff=limit, **limits)
+            with self.phase('extract'):
+                self._ov = result.objective_value()
+                if self._ov is not None:
+                    self._solution = self.__pairs(place_x_values(result.x_values(), 1))
+            report = result.report()
+        else:
+            m = Model(instance.instance_size(), instance.distance(), instance.intensity(), False, [],
+                      False, instance.is_symmetric(), z)
+            with self.phase('build'):
+                result = getattr(m, model)()
+            self._model_size = {'variables': result.numVariables(), 'rows': result.numConstraints(),
+                                'nonzeros': sum(len(row) for row in result.constraints.values())}
+            if permutation is not None:
+                start, start_objective = m.start(model, permutation)
+                limit = start_objective + 1e-6 * max(1.0, abs(start_objective))
+                for variable in result.variables():
+                    variable.setInitialValue(start.get(variable.name, 0.0), check=False)
+            with tempfile.TemporaryDirectory() as directory:
+                log = os.path.join(directory, 'solver.log')
+                with self.phase('solve'):
+                    result.solve(self.__pulp_solver(log, progress, limit))
+                report = {'status': None, 'objective': None, 'bound': None, 'nodes': None}
+                if os.path.isfile(log):
+                    with open(log, 'r', encoding="utf-8", errors="replace") as inputfile:
+                        report = read_solver_log(inputfile.read())
+            if report['status'] is None:
+                report['status'] = pulp.LpStatus[result.status]
+                if result.sol_status == pulp.LpSolutionOptimal:
+                    report['bound'] = result.objective.value()
+            with self.phase('extract'):
+                self._ov = None
+                if result.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible):
+                    self._ov = result.objective.value()
+                    self._solution = self.__pairs(place_x_values(m.x_values(), 1))
+        if start is not None and (self._ov is None or self._ov > start_objective):
+            # the cutoff excludes the start itself, so it is the
+            # solution if the solver finds nothing better
+            self._ov = start_objective
+            self._solution = self.__pairs(permutation)
+            if report['bound'] is None and report['status'] is not None and 'nfeasible' in report['status']:
+                report['bound'] = start_objective
+        if self._solution is None:
+            note = "no incumbent: {}".format(report['status'])
+            self._note = note if self._note is None else self._note + "; " + note
+        self.__report(instance, report)
+
+    @staticmethod
+    def __pairs(permutation):
+        """
+        solution pairs of the placed units of a permutation
+        """
+        return [[float(unit), float(place)] for unit, place in enumerate(permutation) if place >= 0]
+
+    def __start_permutation(self, instance, progress):
+        """
+        permutation of start, solved first if it is an Algorithm
+        """
+        if self._start is None:
+            return None
+        with self.phase('start'):
+            return start_permutation(self._start, instance, progress)
+
+    def __fixing(self, instance, backend, model, permutation, progress):
+        """
+        edges which reduced cost fixing on the relaxation of model fixes
+        to 0 and the permutation of the objective value it compares to
+        """
+        n = instance.instance_size()
+        if backend == 'pulp':
+            m = Model(n, instance.distance(), instance.intensity(), True, [], False, instance.is_symmetric())
+            relaxation = getattr(m, model)()
+            relaxation.solve(pulp.PULP_CBC_CMD(msg=progress, threads=self._threads, timeLimit=self._time_limit))
+            if relaxation.status != pulp.LpStatusOptimal:
+                return [], permutation
+            bound, values, costs = relaxation.objective.value(), m.x_values(), m.reduced_costs()
+        else:
+            m = SparseModel(n, instance.distance_array(), instance.intensity_array(), True, [],
+                            False, instance.is_symmetric())
+            with tempfile.TemporaryDirectory() as directory:
+                if backend == 'lp':
+                    relaxation = getattr(m, model)(LPWriter(os.path.join(directory, 'relaxation.lp')))
+                else:
+                    relaxation = getattr(m, model)()
+                if relaxation.solve(progress, self._threads, self._time_limit) != 'Optimal':
+                    return [], permutation
+            bound, values, costs = relaxation.objective_value(), relaxation.x_values(), relaxation.reduced_costs()
+        if permutation is None:
+            permutation = linear_sum_assignment(values, maximize=True)[1]
+        incumbent = m.start(model, permutation)[1]
+        fixed = bound + costs > incumbent + 1e-6 * max(1.0, abs(incumbent))
+        self._eliminated = int(np.count_nonzero(fixed))
+        note = "fixing: {} of {} x fixed to 0".format(self._eliminated, n * n)
+        self._note = note if self._note is None else self._note + "; " + note
+        if progress:
+            print(note)
+        return [[int(i), int(k)] for i, k in zip(*np.nonzero(fixed))], permutation
+
+    def __pulp_solver(self, log, progress, cutoff=None):
+        """
+        pulp solver with the limits which writes its log to log,
+        CBC and HiGHS start from the initial values of the variables
+        if there is a cutoff
+        """
+        solver = self._solver or SOLVERS['pulp'][0]
+        if solver == 'glpk':
+            options = ['--log', log]
+            if self._gap_rel is not None:
+                options += ['--mipgap', str(self._gap_rel)]
+            command = pulp.GLPK_CMD(msg=progress, timeLimit=self._time_limit, options=options)
+        else:
+            options = []
+            if cutoff is not None:
+                options = ['cutoff {}'.format(cutoff)] if solver == 'cbc' else ['objective_bound={}'.format(cutoff)]
+            command = {'cbc': pulp.PULP_CBC_CMD, 'highs': pulp.HiGHS_CMD}[solver](
+                msg=progress, timeLimit=self._time_limit, gapRel=self._gap_rel, gapAbs=self._gap_abs,
+                threads=self._threads, logPath=log, warmStart=cutoff is not None, options=options)
+        if not command.available():
+            raise ValueError("solver {} is not installed".format(solver))
+        return command
+
+    def __report(self, instance, report):
+        """
+        keep status, bound and nodes of a solver report, the bound
+        of an instance with integral matrices is rounded up
+        """
+        self._status, self._lower_bound, self._nodes = report['status'], report['bound'], report['nodes']
+        if self._lower_bound is not None and np.isfinite(self._lower_bound):
+            d, f = instance.distance_array(), instance.intensity_array()
+            if np.array_equal(d, np.round(d)) and np.array_equal(f, np.round(f)):
+                self._lower_bound = float(np.ceil(self._lower_bound - 1e-6)) + 0.0
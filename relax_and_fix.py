@@ -0,0 +1,121 @@
+"""
+module solving QAP heuristically by rounding LP relaxations of the linearized models
+"""
+
+import os
+import tempfile
+import time
+import numpy as np
+import pulp
+from algorithm import Algorithm
+from lp_models import Model
+from sparse_models import SparseModel, LPWriter
+from functionalities import place_x_values
+
+
+class RelaxAndFix(Algorithm):
+    """
+    relax and fix: the LP relaxation of the model is solved, every unit
+    whose x is at least cutoff is placed, and the relaxation of the
+    reduced QAP of the remaining units is solved again until every unit
+    is placed; if no x reaches cutoff the largest one is placed, so
+    there are at most n rounds of polynomial time
+
+    none of the backends accepts an LP basis, every round starts from
+    scratch, but it only has the free units and places, see Model
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> algorithm = RelaxAndFix()
+    >>> algorithm.solve(qap, 'kaufman_broeckx', 0.9)
+    >>> algorithm.ov >= 9552, qap.is_solution(algorithm.solution), algorithm.rounds() <= 12
+    (True, True, True)
+
+    a clock which passes one second per reading expires the time_limit
+    after the first round, the second round places the remaining units
+    >>> import itertools
+    >>> from unittest import mock
+    >>> algorithm = RelaxAndFix('sparse', time_limit=1.5)
+    >>> with mock.patch('relax_and_fix.time') as clock:
+    ...     clock.time.side_effect = itertools.count()
+    ...     algorithm.solve(qap, 'kaufman_broeckx', 0.9)
+    >>> qap.is_solution(algorithm.solution), algorithm.rounds()
+    (True, 2)
+    """
+
+    def __init__(self, backend='pulp', time_limit=None):
+        """
+        backend = 'pulp', 'sparse' or 'lp' like Optimum
+        time_limit = seconds after which the remaining units are
+                     placed by the last relaxation
+        """
+        super().__init__()
+        self._backend = backend
+        self._time_limit = time_limit
+        self._rounds = None
+
+    def rounds(self):
+        """
+        number of relaxations solved in the last solve
+        """
+        return self._rounds
+
+    def algorithm(self, instance, model, cutoff=1.0, progress=False):
+        """
+        round relaxations of model, x at or above cutoff are placed
+        """
+        start = time.time()
+        n = instance.instance_size()
+        permutation = np.full(n, -1, dtype=np.int64)
+        self._rounds = 0
+        while (permutation < 0).any():
+            a = [[unit, place] for unit, place in enumerate(permutation) if place >= 0]
+            values = self.__relaxation(instance, model, a, progress)
+            self._rounds += 1
+            values[permutation >= 0, :] = -np.inf
+            values[:, permutation[permutation >= 0]] = -np.inf
+            if self._time_limit is not None and time.time() - start > self._time_limit:
+                # every free pair is above the lowest float, taken units and places stay -inf
+                placed = place_x_values(values, np.finfo(float).min)
+            else:
+                placed = place_x_values(values, cutoff)
+                if (placed < 0).all():
+                    unit, place = np.unravel_index(np.argmax(values), values.shape)
+                    placed[unit] = place
+            permutation = np.where(permutation >= 0, permutation, placed)
+            if progress:
+                print("round {} placed {} of {} units".format(self._rounds, np.count_nonzero(permutation >= 0), n))
+
+        self._ov = instance.cost(permutation)
+        self._solution = [[float(unit), float(place)] for unit, place in enumerate(permutation)]
+
+    def __relaxation(self, instance, model, a, progress):
+        """
+        x values of the relaxation of model with the fixed edges a
+        """
+        n = instance.instance_size()
+        if self._backend == 'pulp':
+            m = Model(n, instance.distance(), instance.intensity(), True, a, False, instance.is_symmetric())
+            with self.phase('build'):
+                result = getattr(m, model)()
+            if self._model_size is None:
+                self._model_size = {'variables': result.numVariables(), 'rows': result.numConstraints(),
+                                    'nonzeros': sum(len(row) for row in result.constraints.values())}
+            with self.phase('solve'):
+                result.solve(pulp.PULP_CBC_CMD(msg=progress))
+            return m.x_values()
+
+        m = SparseModel(n, instance.distance_array(), instance.intensity_array(), True, a,
+                        False, instance.is_symmetric())
+        with tempfile.TemporaryDirectory() as directory:
+            with self.phase('build'):
+                if self._backend == 'lp':
+                    result = getattr(m, model)(LPWriter(os.path.join(directory, 'qap.lp')))
+                else:
+                    result = getattr(m, model)()
+            if self._model_size is None:
+                self._model_size = {'variables': result.num_variables(), 'rows': result.num_rows(),
+                                    'nonzeros': result.num_nonzeros()}
+            with self.phase('solve'):
+                result.solve(progress)
+        return result.x_values()
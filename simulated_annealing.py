@@ -0,0 +1,113 @@
+"""
+module solving QAP heuristically with simulated annealing
+"""
+
+import time
+import numpy as np
+from algorithm import Algorithm
+
+
+class SimulatedAnnealing(Algorithm):
+    """
+    simulated annealing with random pairwise exchanges
+
+    several independent chains run in lockstep as one (chains, n) array,
+    every step evaluates one random swap per chain with swap_delta_batch;
+    the start and end temperatures are calibrated from the deltas of
+    random swaps, start accepts the median worsening with probability
+    start_acceptance and end accepts the smallest worsening with
+    probability end_acceptance, the temperature falls geometrically
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> algorithm = SimulatedAnnealing(iterations=20000, seed=0)
+    >>> algorithm.solve(qap, None)
+    >>> algorithm.ov
+    9552.0
+    """
+
+    uses_model = False
+    uses_cutoff = False
+
+    def __init__(self, iterations=None, chains=16, time_limit=None, seed=None,
+                 start_acceptance=0.5, end_acceptance=0.01):
+        """
+        iterations = steps of every chain, 2000 n if neither
+                     iterations nor time_limit are given
+        chains = number of chains run in lockstep
+        time_limit = maximum seconds, without iterations the
+                     schedule is stretched over the time limit
+        seed = seed of the starts and the moves
+        start_acceptance, end_acceptance = calibration of the temperatures
+        """
+        super().__init__()
+        self._iterations = iterations
+        self._chains = chains
+        self._time_limit = time_limit
+        self._seed = seed
+        self._start_acceptance = start_acceptance
+        self._end_acceptance = end_acceptance
+
+    def algorithm(self, instance, model, cutoff=1.0, progress=False):
+        """
+        anneal from random permutations, model and cutoff are not used
+        """
+        start = time.time()
+        n = instance.instance_size()
+        generator = np.random.default_rng(self._seed)
+        iterations = self._iterations
+        if iterations is None and self._time_limit is None:
+            iterations = 2000 * n
+        chains = np.arange(self._chains)
+
+        permutations = np.array([generator.permutation(n) for _ in chains])
+        costs = instance.costs(permutations)
+        best, best_costs = permutations.copy(), costs.copy()
+
+        start_temperature, end_temperature = self.__temperatures(instance, permutations, generator)
+        step = 0
+        while (iterations is None or step < iterations) and \
+              (self._time_limit is None or time.time() - start < self._time_limit):
+            if iterations is None:
+                fraction = (time.time() - start) / self._time_limit
+            else:
+                fraction = step / iterations
+            temperature = start_temperature * (end_temperature / start_temperature) ** fraction
+            step += 1
+            r = generator.integers(0, n, len(chains))
+            s = (r + generator.integers(1, n, len(chains))) % n
+            deltas = instance.swap_delta_batch(permutations, r, s)
+            accepted = (deltas <= 0) | (generator.random(len(chains)) < np.exp(-np.maximum(deltas, 0) / temperature))
+            moved = chains[accepted]
+            permutations[moved, r[accepted]], permutations[moved, s[accepted]] = \
+                permutations[moved, s[accepted]], permutations[moved, r[accepted]]
+            costs[accepted] += deltas[accepted]
+
+            improved = costs < best_costs - 1e-9
+            if improved.any():
+                best[improved], best_costs[improved] = permutations[improved], costs[improved]
+                if progress:
+                    print("step {} temperature {} best {}".format(step, temperature, best_costs.min()))
+            if step % 1000 == 0:
+                costs = instance.costs(permutations)
+
+        winner = int(np.argmin(instance.costs(best)))
+        self._ov = instance.cost(best[winner])
+        self._solution = [[float(unit), float(place)] for unit, place in enumerate(best[winner])]
+
+    def __temperatures(self, instance, permutations, generator):
+        """
+        start and end temperature from the deltas
+        of random swaps of the start permutations
+        """
+        n = permutations.shape[1]
+        samples = np.repeat(permutations, max(1, 1000 // len(permutations)), axis=0)
+        r = generator.integers(0, n, len(samples))
+        s = (r + generator.integers(1, n, len(samples))) % n
+        worsening = instance.swap_delta_batch(samples, r, s)
+        worsening = worsening[worsening > 0]
+        if len(worsening) == 0:
+            return 1.0, 1.0
+        start = np.median(worsening) / -np.log(self._start_acceptance)
+        end = min(worsening.min() / -np.log(self._end_acceptance), start)
+        return start, end
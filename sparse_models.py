@@ -0,0 +1,1104 @@
+#! /usr/bin/env python3
+
+"""
+This module defines a sparse matrix backend for the linearizations
+of lp_models.py. The objective, the constraint matrix and the bounds
+are computed in bulk with numpy and passed to HiGHS through
+scipy.optimize.milp, so no python object is created per variable.
+Alternatively the rows can be streamed block by block into an LP file
+which is solved by CBC.
+"""
+import os
+import re
+import subprocess
+import time
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.optimize import milp, linprog, Bounds, LinearConstraint
+
+from lp_models import Model, _reducible
+
+
+STATUS = {0: 'Optimal', 1: 'Not Solved', 2: 'Infeasible', 3: 'Unbounded', 4: 'Undefined'}
+
+
+class Problem(object):
+    """
+    Basis class of models in matrix form. The first n^2 columns
+    are the variables x_ij in row major order. A problem of a
+    reduced QAP is embedded into the full instance, see embed.
+    """
+    def __init__(self, n, num_variables, num_rows, num_nonzeros):
+        """
+        n = instance size
+        """
+        self._n = n
+        self._num_variables = num_variables
+        self._num_rows = num_rows
+        self._num_nonzeros = num_nonzeros
+        self.status = None
+        self._values = None
+        self._reduced_costs = None
+        self._objective = None
+        self._message = None
+        self._bound = None
+        self._nodes = None
+        self._embedding = None
+        self._offset = 0.0
+
+    def __str__(self):
+        """
+        Returns the object information as a string.
+        """
+        return ("QAP model with " + str(self.num_variables()) + " variables, "
+                + str(self.num_rows()) + " rows and " + str(self.num_nonzeros()) + " nonzeros")
+
+    def num_variables(self):
+        """
+        """
+        return self._num_variables
+
+    def num_rows(self):
+        """
+        """
+        return self._num_rows
+
+    def num_nonzeros(self):
+        """
+        """
+        return self._num_nonzeros
+
+    def solve(self, progress=False, threads=None, time_limit=None, gap_rel=None, gap_abs=None,
+              start=None, cutoff=None):
+        """
+        solve the model, returns the status as a string like pulp.LpStatus
+        Calling this method causes an error.
+
+        threads = number of solver threads
+        time_limit = wall clock seconds after which the search stops
+        gap_rel, gap_abs = relative and absolute gap at which the search stops
+        start = nonzero values of a MIP start by variable name, see Model.start
+        cutoff = only solutions with a lower objective value are searched
+        """
+        raise NotImplementedError
+
+    def _solve_empty(self):
+        """
+        a reduced problem without free units is solved by the fixed
+        edges alone, the solvers reject a model without variables
+        """
+        self.status = self._message = 'Optimal'
+        self._values = np.zeros(0)
+        self._reduced_costs = np.zeros(0)
+        self._objective = self._bound = 0.0
+        self._nodes = 0
+        return self.status
+
+    def embed(self, n, units, places, a, offset):
+        """
+        the problem is the reduced QAP of the free units and places
+        of an instance of size n with the fixed edges a, offset is
+        the constant of the objective which the solver does not see
+        """
+        self._embedding = (n, units, places, a)
+        self._offset = offset
+
+    def objective_value(self):
+        """
+        objective value of the last solve
+        """
+        return self.__shift(self._objective)
+
+    def report(self):
+        """
+        report of the last solve: the status message of the solver,
+        the objective value, the dual bound and the number of nodes
+        """
+        return {'status': self._message, 'objective': self.__shift(self._objective),
+                'bound': self.__shift(self._bound), 'nodes': self._nodes}
+
+    def __shift(self, value):
+        """
+        add the constant of the objective
+        """
+        return value if value is None or self._offset == 0 else value + self._offset
+
+    def x_values(self):
+        """
+        n x n array of the x variables of the last solve,
+        fixed edges of an embedded problem are 1
+        """
+        if self._values is None:
+            return None
+        return self.__full(self._values, 0, 1)
+
+    def reduced_costs(self):
+        """
+        n x n array of the reduced costs of the x variables of the last
+        solve of a relaxation, None after a MILP solve; x_ij of an
+        embedded problem which conflict with a fixed edge are inf,
+        the fixed edges 0
+        """
+        if self._reduced_costs is None:
+            return None
+        return self.__full(self._reduced_costs, np.inf, 0)
+
+    def __full(self, columns, other, fixed):
+        """
+        n x n array of the x columns, for an embedded problem other
+        outside the free units and places and fixed at the fixed edges
+        """
+        values = columns[:self._n * self._n].reshape(self._n, self._n)
+        if self._embedding is None:
+            return values
+        n, units, places, a = self._embedding
+        full = np.full((n, n), float(other))
+        full[np.ix_(units, places)] = values
+        for element in a:
+            full[int(element[0]), int(element[1])] = fixed
+        return full
+
+    def sorted_x_vars(self):
+        """
+        returns x variables in the format of functionalities.get_sorted_x_vars
+        """
+        values = self.x_values()
+        resultvars = [['x_{}_{}'.format(i, k), values[i][k]]
+                      for i in range(len(values)) for k in range(len(values))]
+        return sorted(resultvars, key=lambda x: x[1], reverse=True)
+
+
+class SparseProblem(Problem):
+    """
+    MILP in matrix form
+
+    min c x  s.t.  row_lower <= A x <= row_upper, lower <= x <= upper
+    """
+    def __init__(self, n, c, A, row_lower, row_upper, lower, upper, integrality):
+        """
+        n = instance size
+        c = objective coefficients
+        A = constraint matrix (csr)
+        row_lower, row_upper = row bounds
+        lower, upper = variable bounds
+        integrality = 1 for integer variables, 0 for continuous ones
+        """
+        super().__init__(n, A.shape[1], A.shape[0], A.nnz)
+        self.c = c
+        self.A = A
+        self.row_lower = row_lower
+        self.row_upper = row_upper
+        self.lower = lower
+        self.upper = upper
+        self.integrality = integrality
+
+    def solve(self, progress=False, threads=None, time_limit=None, gap_rel=None, gap_abs=None,
+              start=None, cutoff=None):
+        """
+        solve the model with HiGHS, scipy does not pass threads,
+        gap_abs, start and cutoff to HiGHS so they are ignored;
+        a model without integer variables is solved by linprog
+        which also returns the reduced costs
+        """
+        if self.num_variables() == 0:
+            return self._solve_empty()
+        options = {'disp': progress}
+        if time_limit is not None:
+            options['time_limit'] = time_limit
+        self._reduced_costs = None
+        if not self.integrality.any():
+            return self.__solve_relaxation(options)
+        if gap_rel is not None:
+            options['mip_rel_gap'] = gap_rel
+        result = milp(self.c,
+                      integrality=self.integrality,
+                      bounds=Bounds(self.lower, self.upper),
+                      constraints=LinearConstraint(self.A, self.row_lower, self.row_upper),
+                      options=options)
+        self.status = STATUS.get(result.status, 'Undefined')
+        self._message = result.message
+        self._bound = getattr(result, 'mip_dual_bound', None)
+        self._nodes = getattr(result, 'mip_node_count', None)
+        if result.x is not None:
+            integer = self.integrality == 1
+            self._values = result.x.copy()
+            self._values[integer] = np.round(self._values[integer])
+            self._objective = result.fun
+        return self.status
+
+    def __solve_relaxation(self, options):
+        """
+        solve the model without integer variables with linprog, its
+        ranged rows become equalities or one or two inequalities
+        """
+        equal = self.row_lower == self.row_upper
+        upper = ~equal & np.isfinite(self.row_upper)
+        lower = ~equal & np.isfinite(self.row_lower)
+        A_ub = sp.vstack([self.A[upper], -self.A[lower]], format='csr')
+        b_ub = np.concatenate([self.row_upper[upper], -self.row_lower[lower]])
+        result = linprog(self.c, A_ub=A_ub, b_ub=b_ub, A_eq=self.A[equal], b_eq=self.row_lower[equal],
+                         bounds=np.column_stack([self.lower, self.upper]), method='highs', options=options)
+        self.status = STATUS.get(result.status, 'Undefined')
+        self._message = result.message
+        self._nodes = 0
+        self._bound = result.fun if result.status == 0 else None
+        if result.x is not None:
+            self._values = result.x.copy()
+            self._objective = result.fun
+            self._reduced_costs = result.lower.marginals + result.upper.marginals
+        return self.status
+
+
+class LazyProblem(SparseProblem):
+    """
+    SparseProblem whose rows P x within pool bounds are only added when
+    they are violated: solve repeats to solve the model, adds the
+    violated pool rows, at most batch of the most violated ones, and
+    stops when the solution satisfies the whole pool, so the result is
+    the one of the model with all rows; rounds() has the statistics.
+    Every round is solved from scratch, scipy keeps neither the basis
+    nor the search tree, so the models are smaller but every round
+    repeats the whole search; that pays off for the LP relaxation,
+    while the MILP rounds are capped by milp_rounds, after which all
+    remaining pool rows are added and the last solve is the full model
+
+    >>> from functionalities import QAP
+    >>> qap = QAP('qapdat/small/had12.dat')
+    >>> d, f = qap.distance_array()[:4, :4], qap.intensity_array()[:4, :4]
+    >>> problem = SparseModel(4, d, f).aimms(lazy=True)
+    >>> print(problem.solve(), round(problem.objective_value()), problem.num_rows())
+    Optimal 70 224
+    >>> problem = SparseModel(4, d, f).aimms(lazy=True)
+    >>> problem.milp_rounds = None
+    >>> print(problem.solve(), round(problem.objective_value()), problem.num_rows())
+    Optimal 70 80
+    >>> SparseModel(4, d, f).aimms().num_rows()
+    224
+    >>> problem.rounds()[0]
+    {'rows': 8, 'violated': 6, 'rows added': 6, 'objective': 0.0, 'relaxed': True}
+    """
+    def __init__(self, n, c, A, row_lower, row_upper, lower, upper, integrality,
+                 P, pool_lower, pool_upper, batch=None, milp_rounds=2):
+        """
+        P = csr matrix of the pool rows
+        pool_lower, pool_upper = bounds of the pool rows
+        batch = maximal number of rows added per round, None for all violated ones
+        milp_rounds = MILP solves which may violate pool rows before the
+                      whole pool is added, None for no limit
+        """
+        super().__init__(n, c, A, row_lower, row_upper, lower, upper, integrality)
+        self.P = P
+        self.pool_lower = pool_lower
+        self.pool_upper = pool_upper
+        self.batch = batch
+        self.milp_rounds = milp_rounds
+        self._rounds = []
+
+    def rounds(self):
+        """
+        one dictionary per solve of the last solve: rows of the model,
+        violated pool rows, rows added afterwards and objective value
+        """
+        return [dict(record) for record in self._rounds]
+
+    def report(self):
+        """
+        report of SparseProblem with the rounds
+        """
+        report = super().report()
+        report['rounds'] = self.rounds()
+        return report
+
+    def solve(self, progress=False, threads=None, time_limit=None, gap_rel=None, gap_abs=None,
+              start=None, cutoff=None):
+        """
+        solve until no pool row is violated, the time limit is shared
+        by all rounds; if it runs out while pool rows are violated the
+        status is 'Not Solved' and there is no objective value
+        """
+        begin = time.time()
+        self._rounds = []
+        added = np.zeros(self.P.shape[0], dtype=bool)
+        integrality = self.integrality
+        # rows which the LP relaxation violates are added before the
+        # rounds solve the MILP, that saves most of the MILP solves
+        self.integrality = np.zeros_like(integrality)
+        while True:
+            remaining = None if time_limit is None else max(0.0, time_limit - (time.time() - begin))
+            super().solve(progress, threads, remaining, gap_rel, gap_abs, start, cutoff)
+            if self._values is None:
+                break
+            activity = self.P @ self._values
+            violation = np.maximum(self.pool_lower - activity, activity - self.pool_upper)
+            violated = np.flatnonzero((violation > 1e-6 * np.maximum(1.0, np.abs(activity))) & ~added)
+            count = len(violated)
+            if self.batch is not None and count > self.batch:
+                violated = violated[np.argsort(-violation[violated], kind='stable')[:self.batch]]
+            relaxed = self.integrality is not integrality
+            if count and not relaxed and self.milp_rounds is not None and \
+               sum(not record['relaxed'] for record in self._rounds) + 1 >= self.milp_rounds:
+                # another MILP round would repeat the search, the next one solves the full model
+                violated = np.flatnonzero(~added)
+            self._rounds.append({'rows': self.A.shape[0], 'violated': count, 'rows added': len(violated),
+                                 'objective': self._objective, 'relaxed': relaxed})
+            if progress:
+                print("round {}: {} rows, {} rows added".format(len(self._rounds), self.A.shape[0], len(violated)))
+            if len(violated) == 0 and self.integrality is not integrality and integrality.any():
+                self.integrality = integrality
+                continue
+            if len(violated) == 0:
+                break
+            if time_limit is not None and time.time() - begin >= time_limit:
+                self.status = 'Not Solved'
+                self._objective = None
+                break
+            added[violated] = True
+            self.A = sp.vstack([self.A, self.P[violated]], format='csr')
+            self.row_lower = np.concatenate([self.row_lower, self.pool_lower[violated]])
+            self.row_upper = np.concatenate([self.row_upper, self.pool_upper[violated]])
+        self.integrality = integrality
+        self._num_rows, self._num_nonzeros = self.A.shape[0], self.A.nnz
+        return self.status
+
+
+class LPProblem(Problem):
+    """
+    model written to a file in LP format, solved by the CBC binary shipped with pulp
+    """
+    def __init__(self, n, filename, names, num_rows, num_nonzeros, relaxed=False):
+        """
+        n = instance size
+        filename = LP file
+        names = variable names in column order
+        relaxed = True if the file has no integer variables, then the
+                  reduced costs of the solution file are kept
+        """
+        super().__init__(n, len(names), num_rows, num_nonzeros)
+        self.filename = filename
+        self._names = names
+        self.__relaxed = relaxed
+
+    def solve(self, progress=False, threads=None, time_limit=None, gap_rel=None, gap_abs=None,
+              start=None, cutoff=None):
+        """
+        solve the LP file with CBC, read the solution file and the log
+        """
+        if self.num_variables() == 0:
+            return self._solve_empty()
+        import pulp
+
+        solution_file = os.path.splitext(self.filename)[0] + '.sol'
+        start_file = None
+        if start is not None:
+            start_file = os.path.splitext(self.filename)[0] + '.mst'
+            self.__write_start(start_file, start)
+        command = [pulp.PULP_CBC_CMD().path, self.filename]
+        for option, value in (('-threads', threads), ('-sec', time_limit),
+                              ('-ratioGap', gap_rel), ('-allowableGap', gap_abs),
+                              ('-mips', start_file), ('-cutoff', cutoff)):
+            if value is not None:
+                command += [option, str(value)]
+        if time_limit is not None:
+            command += ['-timeMode', 'elapsed']
+        if self.__relaxed:
+            # without it CBC leaves out the columns with value 0 and their reduced costs
+            command += ['-printingOptions', 'all']
+        command += ['-solve', '-solution', solution_file]
+        log = []
+        with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True) as process:
+            try:
+                for line in process.stdout:
+                    log.append(line)
+                    if progress:
+                        print(line, end='')
+            except BaseException:
+                process.kill()
+                raise
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, command, ''.join(log))
+        if start_file is not None:
+            os.remove(start_file)
+        report = read_solver_log(''.join(log))
+        self._message, self._bound, self._nodes = report['status'], report['bound'], report['nodes']
+
+        if not os.path.isfile(solution_file):
+            self.status = 'Undefined'
+            return self.status
+
+        # the columns of the solution file are index, name, value and reduced cost,
+        # with all printing options the rows come first
+        values = np.zeros(len(self._names))
+        reduced_costs = np.zeros(len(self._names))
+        with open(solution_file, 'r', encoding="utf-8") as inputfile:
+            status = inputfile.readline().split()
+            if self.__relaxed:
+                for _ in range(self.num_rows()):
+                    inputfile.readline()
+            for line in inputfile:
+                line = line.replace('**', '').split()
+                column = int(line[0])
+                assert self._names[column] == line[1]
+                values[column] = float(line[2])
+                reduced_costs[column] = float(line[3])
+        os.remove(solution_file)
+
+        self.status = {'Optimal': 'Optimal', 'Infeasible': 'Infeasible',
+                       'Unbounded': 'Unbounded', 'Stopped': 'Not Solved'}.get(status[0], 'Undefined')
+        if self.status in ('Optimal', 'Not Solved') and 'value' in status:
+            self._values = values
+            self._objective = float(status[-1])
+            if self.__relaxed:
+                self._reduced_costs = reduced_costs
+        return self.status
+
+    def __write_start(self, filename, start):
+        """
+        write a MIP start in the format of CBC solution files
+        """
+        with open(filename, 'w', encoding="utf-8") as outputfile:
+            outputfile.write("Stopped on time - objective value 0\n")
+            for column, name in enumerate(self._names):
+                outputfile.write("{:>7} {} {:>15} {:>23}\n".format(column, name, start.get(name, 0.0), 0))
+
+
+def read_solver_log(log):
+    """
+    status message, objective value, dual bound and number of nodes
+    from the log of CBC, HiGHS or GLPK, None for what is not found
+
+    >>> read_solver_log('''Result - Stopped on time limit
+    ...
+    ... Objective value:                16398.00000000
+    ... Lower bound:                    7245.000
+    ... Gap:                            1.26
+    ... Enumerated nodes:               145''')
+    {'status': 'Stopped on time limit', 'objective': 16398.0, 'bound': 7245.0, 'nodes': 145}
+    >>> read_solver_log('''+   214: mip =   9.552000000e+03 >=     tree is empty   0.0% (0; 97)
+    ... INTEGER OPTIMAL SOLUTION FOUND''')
+    {'status': 'INTEGER OPTIMAL SOLUTION FOUND', 'objective': 9552.0, 'bound': 9552.0, 'nodes': 97}
+    """
+    def number(text):
+        try:
+            return float(text)
+        except ValueError:
+            return None
+
+    report = {'status': None, 'objective': None, 'bound': None, 'nodes': None}
+    patterns = [('status', r'^Result - (.+)$'),                             # CBC
+                ('objective', r'^Objective value:\s+(\S+)'),
+                ('bound', r'^Lower bound:\s+(\S+)'),
+                ('nodes', r'^Enumerated nodes:\s+(\d+)'),
+                ('status', r'^\s*Model status\s*:\s*(.+)$'),              # HiGHS
+                ('objective', r'^\s*Primal bound\s+(\S+)'),
+                ('bound', r'^\s*Dual bound\s+(\S+)'),
+                ('nodes', r'^\s*Nodes\s+(\d+)'),
+                ('status', r'^([A-Z][A-Z ;]+[A-Z])$')]                        # GLPK
+    for line in log.splitlines():
+        for key, pattern in patterns:
+            match = re.match(pattern, line)
+            if match:
+                report[key] = match.group(1).strip() if key == 'status' else number(match.group(1))
+        match = re.match(r'^[+*]\s*\d+: mip =\s*(\S+)\s+[<>]=\s+(.+?)\s+\S+%?\s+\(\d+; (\d+)\)', line)
+        if match:
+            report['objective'] = number(match.group(1))
+            report['bound'] = report['objective'] if match.group(2) == 'tree is empty' else number(match.group(2))
+            report['nodes'] = number(match.group(3))
+    if report['nodes'] is not None:
+        report['nodes'] = int(report['nodes'])
+    if report['bound'] is None and report['status'] is not None and \
+       report['status'].lower().startswith(('optimal', 'integer optimal')):
+        report['bound'] = report['objective']
+    return report
+
+
+class _Rows(object):
+    """
+    collects blocks of constraint rows in coordinate format
+    """
+    def __init__(self):
+        self.count = 0
+        self.nonzeros = 0
+        self.rows = []
+        self.cols = []
+        self.vals = []
+        self.lower = []
+        self.upper = []
+        self.removed = 0
+        self.exact = True
+        self.lazy = None
+
+    def columns(self, c, lower, upper, integrality, names):
+        """
+        objective and bounds of all variables,
+        names is a function returning the variable names
+        """
+        self.c = c
+        self.lower_bounds = lower
+        self.upper_bounds = upper
+        self.integrality = integrality
+
+    def add(self, terms, lower, upper, mask=True, lazy=False):
+        """
+        add a family of rows, one row for every index where mask holds
+
+        terms = list of (cols, vals), the last axis of cols contains
+                the columns of one row, the leading axes index the rows
+        lower, upper = row bounds
+        lazy = keep the rows in a pool from which LazyProblem
+               adds them when they are violated
+        entries with a negative column or a zero value are skipped,
+        the family is passed on in blocks along its first axis
+
+        column -2 marks a skipped variable with lower bound 0, the rows
+        containing it are relaxed, see __project
+        """
+        shape = np.broadcast_shapes(np.shape(mask), np.shape(lower), np.shape(upper),
+                                    *[np.shape(cols)[:-1] for cols, _ in terms])
+        shape = (1,) * (2 - len(shape)) + shape
+        mask = np.broadcast_to(mask, shape)
+        lower = np.broadcast_to(np.asarray(lower, dtype=float), shape)
+        upper = np.broadcast_to(np.asarray(upper, dtype=float), shape)
+        terms = [(np.broadcast_to(cols, shape + np.shape(cols)[-1:]),
+                  np.broadcast_to(vals, shape + np.shape(cols)[-1:])) for cols, vals in terms]
+        for a in range(shape[0]):
+            block = mask[a]
+            cols = np.concatenate([cols[a][block] for cols, _ in terms], axis=-1)
+            vals = np.concatenate([vals[a][block] for _, vals in terms], axis=-1)
+            rows = self.__project(cols, vals, lower[a][block], upper[a][block])
+            if lazy:
+                if self.lazy is None:
+                    self.lazy = _Rows()
+                self.lazy._emit(*rows)
+            else:
+                self._emit(*rows)
+
+    def __project(self, cols, vals, lower, upper):
+        """
+        remove skipped variables from a block of rows: the bound which
+        the skipped term could help to satisfy is dropped, rows which are
+        satisfied by every nonnegative point afterwards are removed and
+        a relaxed equality makes the model inexact
+        """
+        skipped = cols == -2
+        affected = skipped.any(axis=1)
+        if not affected.any():
+            return cols, vals, lower, upper
+        self.exact = self.exact and not (affected & (lower == upper)).any()
+        lower = np.where((skipped & (vals > 0)).any(axis=1), -np.inf, lower)
+        upper = np.where((skipped & (vals < 0)).any(axis=1), np.inf, upper)
+        present = cols >= 0
+        nonnegative = (~present | (self.lower_bounds[np.where(present, cols, 0)] >= 0)).all(axis=1)
+        coefficients = np.where(present, vals, 0)
+        trivial = nonnegative & (np.isneginf(lower) | ((coefficients >= 0).all(axis=1) & (lower <= 0))) \
+                              & (np.isposinf(upper) | ((coefficients <= 0).all(axis=1) & (upper >= 0)))
+        remove = affected & trivial
+        self.removed += np.count_nonzero(remove)
+        return cols[~remove], vals[~remove], lower[~remove], upper[~remove]
+
+    def _emit(self, cols, vals, lower, upper):
+        """
+        store one block of rows
+        """
+        m = cols.shape[0]
+        rows = np.broadcast_to(np.arange(self.count, self.count + m)[:, None], cols.shape)
+        keep = (cols >= 0) & (vals != 0)
+        self.rows.append(rows[keep])
+        self.cols.append(cols[keep])
+        self.vals.append(vals[keep])
+        self.lower.append(lower)
+        self.upper.append(upper)
+        self.count += m
+        self.nonzeros += np.count_nonzero(keep)
+
+    def matrix(self, columns):
+        """
+        the rows as csr matrix
+        """
+        if self.count == 0:
+            return sp.csr_matrix((0, columns))
+        return sp.coo_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))),
+                             shape=(self.count, columns)).tocsr()
+
+    def problem(self, n):
+        """
+        returns the assembled SparseProblem, a LazyProblem if rows are lazy
+        """
+        A = self.matrix(len(self.c))
+        bounds = [np.concatenate(self.lower or [np.zeros(0)]), np.concatenate(self.upper or [np.zeros(0)]),
+                  self.lower_bounds, self.upper_bounds, self.integrality]
+        if self.lazy is None:
+            return SparseProblem(n, self.c, A, *bounds)
+        return LazyProblem(n, self.c, A, *bounds, self.lazy.matrix(len(self.c)),
+                           np.concatenate(self.lazy.lower or [np.zeros(0)]),
+                           np.concatenate(self.lazy.upper or [np.zeros(0)]))
+
+
+class LPWriter(_Rows):
+    """
+    streams a model row block by row block into a file in LP format,
+    only one block of rows is held in memory at a time
+
+    >>> import tempfile
+    >>> from functionalities import QAP, create_new_instance
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> d = create_new_instance(qap.distance(), [0, 1, 2, 3, 4])
+    >>> i = create_new_instance(qap.intensity(), [0, 1, 2, 3, 4])
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     for name in ['adam_johnson', 'aimms', 'padberg', 'fireze_yadegar', 'kaufman_broeckx', 'lawler']:
+    ...         problem = getattr(SparseModel(5, d, i, False, [[0, 1]]), name)(LPWriter(directory + '/qap.lp'))
+    ...         print(name, problem.solve(), problem.objective_value())
+    adam_johnson Optimal 14554.0
+    aimms Optimal 14554.0
+    padberg Optimal 14554.0
+    fireze_yadegar Optimal 14554.0
+    kaufman_broeckx Optimal 14554.0
+    lawler Optimal 14554.0
+    """
+    def __init__(self, filename, terms_per_line=8):
+        """
+        filename = LP file to write
+        terms_per_line = objective terms written per line
+        """
+        super().__init__()
+        self.filename = filename
+        self._terms_per_line = terms_per_line
+        self._file = None
+
+    def add(self, terms, lower, upper, mask=True, lazy=False):
+        """
+        lazy rows need the loop of LazyProblem, an LP file gets all rows
+        """
+        if lazy:
+            raise ValueError("lazy rows are only supported by the in memory SparseProblem")
+        super().add(terms, lower, upper, mask)
+
+    def columns(self, c, lower, upper, integrality, names):
+        """
+        write the objective, the bounds are kept for the end of the file
+        """
+        super().columns(c, lower, upper, integrality, names)
+        self._names = names()
+        self._file = open(self.filename, 'w', encoding="utf-8")
+        self._file.write("\\ QAP\nMinimize\n obj:")
+        for start in range(0, len(c), self._terms_per_line):
+            stop = min(start + self._terms_per_line, len(c))
+            self._file.write(self.__terms(range(start, stop), c[start:stop], True) + "\n")
+        self._file.write("Subject To\n")
+
+    def __terms(self, cols, vals, zeros=False):
+        """
+        linear expression in LP format
+        """
+        return "".join(" {} {} {}".format('-' if v < 0 else '+', '%.15g' % abs(v), self._names[j])
+                       for j, v in zip(cols, vals) if zeros or v != 0)
+
+    def _emit(self, cols, vals, lower, upper):
+        """
+        write one block of rows
+        """
+        ordered = np.sort(cols, axis=1)
+        duplicates = ((ordered[:, 1:] == ordered[:, :-1]) & (ordered[:, 1:] >= 0)).any(axis=1)
+        for row in range(cols.shape[0]):
+            keep = cols[row] >= 0
+            row_cols, row_vals = cols[row][keep], vals[row][keep]
+            if duplicates[row]:
+                row_cols, inverse = np.unique(row_cols, return_inverse=True)
+                row_vals = np.bincount(inverse, weights=row_vals)
+            expression = self.__terms(row_cols, row_vals)
+            self.nonzeros += np.count_nonzero(row_vals)
+            if lower[row] == upper[row]:
+                senses = [('=', lower[row])]
+            else:
+                senses = [(sense, bound) for sense, bound in (('>=', lower[row]), ('<=', upper[row]))
+                          if np.isfinite(bound)]
+            for sense, bound in senses:
+                self._file.write(" r_{}:{} {} {}\n".format(self.count, expression or " 0 " + self._names[0],
+                                                           sense, '%.15g' % bound))
+                self.count += 1
+
+    def problem(self, n):
+        """
+        write bounds and integrality, returns the LPProblem
+        """
+        lower, upper = self.lower_bounds, self.upper_bounds
+        binary = (self.integrality == 1) & (lower == 0) & (upper == 1)
+        self._file.write("Bounds\n")
+        for j in np.flatnonzero(~binary & ((lower != 0) | (upper != np.inf))):
+            if lower[j] == -np.inf and upper[j] == np.inf:
+                self._file.write(" {} free\n".format(self._names[j]))
+            elif upper[j] == np.inf:
+                self._file.write(" {} >= {}\n".format(self._names[j], '%.15g' % lower[j]))
+            else:
+                self._file.write(" {} <= {} <= {}\n".format('%.15g' % lower[j], self._names[j], '%.15g' % upper[j]))
+        for section, integer in (("Generals", (self.integrality == 1) & ~binary), ("Binaries", binary)):
+            if integer.any():
+                self._file.write(section + "\n")
+                for j in np.flatnonzero(integer):
+                    self._file.write(" {}\n".format(self._names[j]))
+        self._file.write("End\n")
+        self._file.close()
+        return LPProblem(n, self.filename, self._names, self.count, self.nonzeros, not self.integrality.any())
+
+
+class SparseModel(Model):
+    """
+    Same linearizations as Model, but every method returns a Problem
+    which is built with array operations instead of pulp objects.
+    Without output the model is assembled in memory as SparseProblem,
+    with an LPWriter as output it is streamed into an LP file.
+
+    >>> import pulp
+    >>> from functionalities import QAP, create_new_instance
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> d = create_new_instance(qap.distance(), [0, 1, 2, 3, 4])
+    >>> i = create_new_instance(qap.intensity(), [0, 1, 2, 3, 4])
+    >>> for name in ['adam_johnson', 'aimms', 'padberg', 'fireze_yadegar', 'kaufman_broeckx', 'lawler']:
+    ...     reference = getattr(Model(5, d, i, False, [[0, 1]]), name)()
+    ...     _ = reference.solve(pulp.PULP_CBC_CMD(msg=False))
+    ...     problem = getattr(SparseModel(5, d, i, False, [[0, 1]]), name)()
+    ...     _ = problem.solve()
+    ...     print(name, reference.objective.value(), problem.objective_value())
+    adam_johnson 14554.0 14554.0
+    aimms 14554.0 14554.0
+    padberg 14554.0 14554.0
+    fireze_yadegar 14554.0 14554.0
+    kaufman_broeckx 14554.0 14554.0
+    lawler 14554.0 14554.0
+
+    With s the esc instances lose most of their y variables, aimms stays exact,
+    esc16c is symmetric so the remaining y_ijkl and y_jilk are merged:
+
+    >>> qap = QAP('qapdat/small/esc16c.dat')
+    >>> d = create_new_instance(qap.distance(), [0, 1, 2, 3, 4, 5])
+    >>> i = create_new_instance(qap.intensity(), [0, 1, 2, 3, 4, 5])
+    >>> model = SparseModel(6, d, i, False, [], True)
+    >>> problem = model.aimms()
+    >>> print(problem.solve(), round(problem.objective_value()), problem.num_variables())
+    Optimal 12 196
+    >>> model.reduction()
+    {'variables removed': 290, 'rows removed': 870, 'rows added': 0, 'variables merged': 450, 'rows merged': 450, 'exact': True}
+    >>> reference = Model(6, d, i, False, [], True)
+    >>> _, _ = reference.padberg(), model.padberg()
+    >>> reference.reduction() == model.reduction()
+    True
+
+    With z the edges are fixed to 0 and the y variables of their products disappear:
+
+    >>> qap = QAP('qapdat/small/chr12a.dat')
+    >>> d = create_new_instance(qap.distance(), [0, 1, 2, 3, 4])
+    >>> i = create_new_instance(qap.intensity(), [0, 1, 2, 3, 4])
+    >>> reference = Model(5, d, i, False, [], False, None, [[0, 2], [1, 4]]).aimms()
+    >>> _ = reference.solve(pulp.PULP_CBC_CMD(msg=False))
+    >>> problem = SparseModel(5, d, i, False, [], False, None, [[0, 2], [1, 4]]).aimms()
+    >>> print(problem.solve(), reference.objective.value(), round(problem.objective_value()), problem.num_variables())
+    Optimal 9486.0 9486 194
+    >>> SparseModel(5, d, i).aimms().num_variables()
+    225
+    """
+
+    def __columns(self, output, c_y, keep, y_lower, y_upper, y_integer, x_upper=np.inf):
+        """
+        pass objective, bounds and integrality of x followed by
+        the y variables where keep holds to the output
+        """
+        n = self._n
+        m = len(c_y)
+        lower = np.zeros(n * n)
+        if self._r:
+            upper = np.full(n * n, float(x_upper))
+            integrality = np.zeros(n * n)
+        else:
+            upper = np.ones(n * n)
+            integrality = np.ones(n * n)
+        upper[np.ravel(self._zeros())] = 0
+        linear = np.zeros(n * n) if self._linear is None else np.ravel(self._linear)
+        c = np.concatenate([linear, c_y])
+        lower = np.concatenate([lower, np.full(m, float(y_lower))])
+        upper = np.concatenate([upper, np.full(m, float(y_upper))])
+        integrality = np.concatenate([integrality, np.full(m, int(y_integer))])
+        output.columns(c, lower, upper, integrality, lambda: self.__names(keep))
+
+    def __names(self, keep):
+        """
+        variable names like pulp creates them, with the
+        indices of the full instance for a reduced model
+        """
+        n = self._n
+        names = []
+        for prefix, indices in (('x', np.indices((n, n)).reshape(2, -1)), ('y', np.nonzero(keep))):
+            name = np.full(len(indices[0]), prefix)
+            if self._labels is not None:
+                indices = [labels[index] for labels, index in zip(self._labels[prefix], indices)]
+            for index in indices:
+                name = np.char.add(np.char.add(name, '_'), index.astype(str))
+            names.append(name)
+        return np.concatenate(names)
+
+    def __needed(self, keep, c_ijkl, axes=None):
+        """
+        quadruples of keep which get a y variable and their costs, with s
+        only those with nonzero cost; if the quadruples are merged with
+        their partners c_ijkl.transpose(axes) only the smaller one of
+        each pair is needed, its cost is the sum of both
+        """
+        c_ijkl = np.broadcast_to(c_ijkl, keep.shape)
+        if axes is not None and self._merging():
+            canonical = self.__canonical(keep.shape, axes)
+            c_ijkl = np.where(canonical & canonical.transpose(axes), c_ijkl, c_ijkl + c_ijkl.transpose(axes))
+            self._reduction['variables merged'] = int(np.count_nonzero(keep & ~canonical))
+            keep = keep & canonical
+        needed = keep
+        if self._s:
+            needed = keep & (c_ijkl != 0)
+            self._reduction['variables removed'] += int(np.count_nonzero(keep & ~needed))
+        return needed, c_ijkl[needed]
+
+    def __free(self, keep, kind='uupp'):
+        """
+        quadruples of keep whose y is not a product with an x fixed to 0,
+        the others are removed variables, see Model._zero
+        """
+        self._new_reduction()
+        zero = keep & self._zero(kind)
+        self._reduction['variables removed'] = int(np.count_nonzero(zero))
+        return keep & ~zero
+
+    def __y_ids(self, keep, needed, axes=None):
+        """
+        column of every quadruple y_ijkl, -1 if it is not part of the model,
+        -2 if it was skipped because its cost is zero, merged quadruples
+        get the column of their partner
+        """
+        n = self._n
+        y = np.full(keep.shape, -1, dtype=np.int64)
+        y[keep] = -2
+        y[needed] = n * n + np.arange(np.count_nonzero(needed))
+        if axes is not None and self._merging():
+            y = np.where(self.__canonical(keep.shape, axes) | ~keep, y, y.transpose(axes))
+        return y
+
+    @staticmethod
+    def __canonical(shape, axes):
+        """
+        True for quadruples which are not lexicographically
+        greater than their partner in the transpose axes
+        """
+        indices = np.indices(shape)
+        less = np.zeros(shape, dtype=bool)
+        equal = np.ones(shape, dtype=bool)
+        for index, partner in zip(indices, indices[list(axes)]):
+            less |= equal & (index < partner)
+            equal &= index == partner
+        return less | equal
+
+    def __merged_rows(self, keep, canonical):
+        """
+        quadruples of keep whose row repeats the row of their partner
+        if y is merged, they are counted in the reduction report
+        """
+        if not self._merging():
+            return np.zeros(keep.shape, dtype=bool)
+        merged = keep & ~canonical
+        self._reduction['rows merged'] += int(np.count_nonzero(merged))
+        return merged
+
+    def _embed(self, problem, sub, constant):
+        """
+        embed the problem of the reduced model sub, its
+        x costs are already part of the objective
+        """
+        units, places = sub._labels['x']
+        problem.embed(self._n, units, places, self._a, constant)
+        return problem
+
+    def __problem(self, output):
+        """
+        finish the output and complete the reduction report
+        """
+        problem = output.problem(self._n)
+        self._reduction['rows removed'] += int(output.removed)
+        self._reduction['exact'] = self._reduction['exact'] and output.exact
+        return problem
+
+    def __products(self, output, y, needed, x_a, x_b):
+        """
+        with s the rows y >= x_a + x_b - 1 of the needed y, which
+        make the relaxed linking rows exact for nonnegative costs,
+        see Model.__products
+        """
+        if not self._s:
+            return
+        output.add([(y[..., None], 1), (x_a, -1), (x_b, -1)], -1, np.inf, needed)
+        self._reduction['rows added'] += int(np.count_nonzero(needed))
+        output.exact = output.exact or self._nonnegative()
+
+    def __assignment(self, output):
+        """
+        row and column constraints, returns the x column ids
+        """
+        n = self._n
+        x = np.arange(n * n).reshape(n, n)
+        output.add([(x, 1)], 1, 1)
+        output.add([(x.T, 1)], 1, 1)
+        return x
+
+    @_reducible
+    def adam_johnson(self, output=None):
+        """
+        """
+        output = output or _Rows()
+        n = self._n
+        i, j, k, l = np.indices((n,) * 4, sparse=True)
+        keep = self.__free((i != k) & (j != l), 'upup')
+        c_ijkl = self._store().outer().transpose(0, 2, 1, 3)
+        needed, c_y = self.__needed(keep, c_ijkl, (2, 3, 0, 1))
+        y = self.__y_ids(keep, needed, (2, 3, 0, 1))
+        self.__columns(output, c_y, needed, 0, np.inf, False)
+
+        x = self.__assignment(output)
+        a, b, e = np.indices((n,) * 3, sparse=True)
+        output.add([(y.transpose(1, 2, 3, 0), 1), (x[None, :, :, None], -1)], 0, 0, a != e)
+        output.add([(y.transpose(0, 2, 3, 1), 1), (x[None, :, :, None], -1)], 0, 0, a != b)
+        if self._merging():
+            self._reduction['rows merged'] = int(np.count_nonzero((i < k) & (j != l)))
+        else:
+            output.add([(y[..., None], 1), (y.transpose(2, 3, 0, 1)[..., None], -1)], 0, 0, (i < k) & keep)
+        self.__products(output, y, needed, x[:, :, None, None, None], x[None, None, :, :, None])
+
+        return self.__problem(output)
+
+    @_reducible
+    def aimms(self, output=None, lazy=False):
+        """
+        lazy = both families of linking rows are lazy rows, see LazyProblem
+        """
+        output = output or _Rows()
+        n = self._n
+        i, j, k, l = np.indices((n,) * 4, sparse=True)
+        keep = self.__free((i != j) & (k != l))
+        c_ijkl = self._store().outer()
+        needed, c_y = self.__needed(keep, c_ijkl, (1, 0, 3, 2))
+        y = self.__y_ids(keep, needed, (1, 0, 3, 2))
+        self.__columns(output, c_y, needed, 0, 1, not self._r, 1)
+
+        x = self.__assignment(output)
+        x_ik = x[:, None, :, None, None]
+        x_jl = x[None, :, None, :, None]
+        output.add([(y[..., None], 1), (x_ik, -1)], -np.inf, 0, keep, lazy)
+        merged = self.__merged_rows(keep, i < j)
+        output.add([(y[..., None], 1), (x_ik, -1), (x_jl, -1)], -1, np.inf, keep & ~merged, lazy)
+
+        return self.__problem(output)
+
+    @_reducible
+    def fireze_yadegar(self, output=None):
+        """
+        """
+        output = output or _Rows()
+        n = self._n
+        i, j, k, l = np.indices((n,) * 4, sparse=True)
+        keep = self.__free(np.ones((n,) * 4, dtype=bool))
+        c_ijkl = self._store().outer() * ((i != j) & (k != l))
+        needed, c_y = self.__needed(keep, c_ijkl, (1, 0, 3, 2))
+        y = self.__y_ids(keep, needed, (1, 0, 3, 2))
+        self.__columns(output, c_y, needed, 0, 1, False)
+
+        x = self.__assignment(output)
+        # with merged y lin 1 and lin 3 repeat lin 2 and lin 4
+        if self._merging():
+            self._reduction['rows merged'] = 2 * n ** 3
+        else:
+            output.add([(y.transpose(1, 2, 3, 0), 1), (x[:, None, :, None], -1)], 0, 0)
+        output.add([(y.transpose(0, 2, 3, 1), 1), (x[:, :, None, None], -1)], 0, 0)
+        if not self._merging():
+            output.add([(y.transpose(0, 1, 3, 2), 1), (x[None, :, :, None], -1)], 0, 0)
+        output.add([(y, 1), (x[:, None, :, None], -1)], 0, 0)
+        diagonal = np.arange(n)[:, None]
+        output.add([(y[diagonal, diagonal, diagonal.T, diagonal.T][..., None], 1), (x[..., None], -1)], 0, 0)
+        self.__products(output, y, needed, x[:, None, :, None, None], x[None, :, None, :, None])
+
+        return self.__problem(output)
+
+    @_reducible
+    def kaufman_broeckx(self, output=None):
+        """
+        """
+        output = output or _Rows()
+        n = self._n
+        d_ik = self._store().row_sums()
+        keep = np.ones((n, n), dtype=bool)
+        self._new_reduction()
+        self.__columns(output, np.ones(n * n), keep, 0, np.inf, False)
+
+        x = self.__assignment(output)
+        y = n * n + x
+        d_ijkl = self._store().outer().transpose(0, 2, 1, 3).reshape(n, n, n * n)
+        output.add([(x.reshape(1, 1, -1), d_ijkl), (x[..., None], d_ik[..., None]), (y[..., None], -1)],
+                   -np.inf, d_ik)
+
+        return self.__problem(output)
+
+    @_reducible
+    def lawler(self, output=None, lazy=False):
+        """
+        Solve QAP ILP linearized with Lawler (1963)
+
+        lazy = the rows 2 y_ijkl <= x_ik + x_jl (and y_ijkl >= x_ik + x_jl - 1
+               with s) are lazy rows, see LazyProblem
+        """
+        output = output or _Rows()
+        n = self._n
+        keep = self.__free(np.ones((n,) * 4, dtype=bool))
+        c_ijkl = self._store().outer()
+        needed, c_y = self.__needed(keep, c_ijkl, (1, 0, 3, 2))
+        y = self.__y_ids(keep, needed, (1, 0, 3, 2))
+        if self._r:
+            # with lazy rows y_ijkl <= 1, which every lin 2 row implies, keeps the first rounds bounded
+            self.__columns(output, c_y, needed, 0 if self._s else -np.inf, 1 if lazy else np.inf, False)
+        else:
+            self.__columns(output, c_y, needed, 0, 1, True)
+
+        x = self.__assignment(output)
+        x_ik = x[:, None, :, None, None]
+        x_jl = x[None, :, None, :, None]
+        if self._s:
+            output.add([(y[..., None], 1), (x_ik, -1), (x_jl, -1)], -1, np.inf, needed, lazy)
+            self._reduction['rows removed'] += 1
+            self._reduction['rows added'] += int(np.count_nonzero(needed))
+        else:
+            output.add([(y.reshape(1, -1), 1)], n ** 2, n ** 2)
+        merged = self.__merged_rows(keep, self.__canonical(keep.shape, (1, 0, 3, 2)))
+        output.add([(x_ik, 1), (x_jl, 1), (y[..., None], -2)], 0, np.inf, keep & ~merged, lazy)
+
+        return self.__problem(output)
+
+    @_reducible
+    def padberg(self, output=None):
+        """
+
+        """
+        output = output or _Rows()
+        n = self._n
+        i, j, k, l = np.indices((n,) * 4, sparse=True)
+        keep = self.__free((i < j) & (k != l))
+        q_ijkl = self._store().symmetrized()
+        needed, c_y = self.__needed(keep, q_ijkl)
+        y = self.__y_ids(keep, needed)
+        self.__columns(output, c_y, needed, 0, np.inf, False)
+
+        x = self.__assignment(output)
+        a, b, e = np.indices((n,) * 3, sparse=True)
+        y_cols = np.where(y.transpose(1, 2, 3, 0) != -1, y.transpose(1, 2, 3, 0), y.transpose(0, 3, 2, 1))
+        output.add([(y_cols, 1), (x[:, None, :, None], -1)], 0, 0,
+                   ((b != e) & (a <= n - 2)) | ((e < b) & (a == n - 1)))
+        output.add([(y, 1), (x[:, None, :, None], -1)], 0, 0,
+                   ((a <= n - 4) & (a < b) & (b <= n - 2)) | ((e <= n - 2) & (a == n - 3) & (b == n - 2)))
+        output.add([(y.transpose(0, 1, 3, 2), 1), (x[None, :, :, None], -1)], 0, 0,
+                   (e <= n - 2) & (a <= n - 4) & (a < b) & (b <= n - 2))
+        if self._s:
+            # Model has a row y >= 0 for every y, the column bounds replace them here
+            self._reduction['rows removed'] += int(np.count_nonzero(keep & ~needed))
+        self.__products(output, y, needed, x[:, None, :, None, None], x[None, :, None, :, None])
+
+        return self.__problem(output)